@@ -0,0 +1,151 @@
+"""
+analysis.py
+
+Analyzes positions without playing on them: the best move, its score, the principal variation and
+the nodes searched, one position at a time with analyze() or a whole file of them on a pool of worker
+processes.
+
+    python3 analysis.py positions.jsonl --depth 6 --workers 4 --output analysis.jsonl
+    python3 analysis.py positions.jsonl --bot '{"method": "pvs", "mid_eval": "piece2val", "time_limit_ms": 200}'
+
+Input is JSON lines, one position per line: {"board": [red men, red kings, blue men, blue kings],
+"turn": "red" or "blue"}, the form server.py sends boards in; any other fields of the line (an id,
+say) are copied to its output line. Output is JSON lines in input order, each the input fields plus
+"move" and "pv" as [start, [landing squares]] lists, "score" from the side to move's point of view,
+"result", "nodes", "depth" and "ms". "result" is "win" or "loss" when the search found the game won
+or lost for the side to move (or it has no move), and the score is then null; otherwise it is null.
+Positions are read as they are needed and at most --in-flight of them are being analyzed or waiting
+to be written at any time, so an archive of any size streams through in constant memory.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from collections import OrderedDict, deque
+from time import perf_counter
+
+import gamebot
+from engine import Board, GameState, Position, RED, BLUE
+
+COLORS = {'red': RED, 'blue': BLUE}
+
+DEFAULT_BOT = {'method': 'alpha_beta', 'mid_eval': 'piece_and_board', 'end_eval': 'sum_of_dist',
+               'tt_size_mb': 16, 'move_ordering': True}
+
+# bots of this process by side to move, rules, Bot arguments and eval, kept so their transposition
+# tables stay warm from one position to the next; the least recently used is closed when there
+# are more than MAX_BOTS
+MAX_BOTS = 8
+_bots = OrderedDict()
+
+
+def position_bot(position, forced_capture, config):
+    """
+    Returns a bot for the side to move with config (Bot arguments), set up on its own copy of position.
+    Kings-only positions get a bot on the end eval, if config has one, like a game bot switches to it.
+    """
+    masks = position[1:]
+    end_eval_time = config.get('end_eval') is not None and not (position.red_men | position.blue_men)
+    key = (position.turn, forced_capture, tuple(sorted(config.items())), end_eval_time)
+    if key in _bots:
+        _bots.move_to_end(key)
+    else:
+        bot = gamebot.Bot(GameState(Board(), position.turn, forced_capture), position.turn, **config)
+        if end_eval_time:
+            bot._end_eval_time = True
+            bot._current_eval = bot._end_eval
+        _bots[key] = bot
+        if len(_bots) > MAX_BOTS:
+            _bots.popitem(last=False)[1].close()
+    bot = _bots[key]
+    bot.game.board.set_position(*masks)
+    bot.game.turn = position.turn
+    bot.game.endit = False
+    return bot
+
+
+def analyze(position, depth=None, forced_capture=False, **bot_args):
+    """
+    Analyzes position (an engine.Position) depth plies deep, or as deep as bot_args' time_limit_ms
+    allows, with a bot made from bot_args (DEFAULT_BOT when there are none). Returns a gamebot.Analysis;
+    nothing outside this module's bots is changed.
+    """
+    bot = position_bot(Position(*position), forced_capture, bot_args or DEFAULT_BOT)
+    return bot.analyze(bot.game.board, depth)
+
+
+def move_json(move):
+    return [move.start, list(move.path)]
+
+
+def read_positions(lines):
+    """Yields (Position, other fields) for each JSON line of lines, as it is read."""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        fields = json.loads(line)
+        try:
+            position = Position(COLORS[fields.pop('turn')], *fields.pop('board'))
+        except (KeyError, TypeError) as error:
+            raise ValueError('line %d is not a position: %s' % (number, error))
+        yield position, fields
+
+
+def _analyze_job(job):
+    # Runs in a worker process: one line of output for one position.
+    position, fields, depth, forced_capture, config = job
+    start = perf_counter()
+    result = analyze(position, depth, forced_capture, **config)
+    # a won or lost game scores +-inf, which is not JSON
+    won = {float('inf'): 'win', -float('inf'): 'loss'}.get(result.score)
+    fields.update(move=move_json(result.move) if result.move is not None else None,
+                  score=None if won else result.score, result=won,
+                  pv=[move_json(move) for move in result.pv], nodes=result.nodes, depth=result.depth,
+                  ms=1000 * (perf_counter() - start))
+    return fields
+
+
+def analyze_stream(positions, pool, in_flight, depth=None, forced_capture=False, config=None):
+    """
+    Yields the output fields of every (Position, fields) of positions in order, analyzed on pool. No more
+    than in_flight positions are taken from positions before their results have been yielded.
+    """
+    pending = deque()
+    for position, fields in positions:
+        if len(pending) >= in_flight:
+            yield pending.popleft().get()
+        pending.append(pool.apply_async(_analyze_job, ((position, fields, depth, forced_capture, config or DEFAULT_BOT),)))
+    while pending:
+        yield pending.popleft().get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='positions, JSON lines ("-" for standard input)')
+    parser.add_argument('--output', default='-', help='where to write the analysis (default: standard output)')
+    parser.add_argument('--depth', type=int, help='plies to search (default: the bot\'s depth or time limit)')
+    parser.add_argument('--bot', type=json.loads, default=DEFAULT_BOT, help='Bot arguments as a JSON object')
+    parser.add_argument('--forced-capture', action='store_true', help='a player must jump when they can')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes (default: one per core)')
+    parser.add_argument('--in-flight', type=int, help='positions being analyzed at once (default: 4 per worker)')
+    args = parser.parse_args()
+    if args.depth is None and args.bot.get('time_limit_ms') is None:
+        args.depth = args.bot.get('depth', 1)
+
+    source = sys.stdin if args.input == '-' else open(args.input)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    count = 0
+    start = perf_counter()
+    with multiprocessing.Pool(args.workers) as pool:
+        for fields in analyze_stream(read_positions(source), pool, args.in_flight or 4 * args.workers,
+                                     args.depth, args.forced_capture, args.bot):
+            output.write(json.dumps(fields, allow_nan=False) + '\n')
+            count += 1
+    output.flush()
+    print('%d positions in %.1f s' % (count, perf_counter() - start), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
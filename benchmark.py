@@ -0,0 +1,367 @@
+"""
+benchmark.py
+
+Benchmarks for the game bot on a fixed set of positions.
+
+    python3 benchmark.py ordering --depth 5
+    python3 benchmark.py parallel --depth 6 --max-workers 4
+    python3 benchmark.py eval
+    python3 benchmark.py quiescence --depth 3 --against 5
+    python3 benchmark.py board
+    python3 benchmark.py suite
+    python3 benchmark.py suite --save baseline.json
+    python3 benchmark.py suite --baseline baseline.json --threshold 10
+
+ordering: nodes searched at a fixed depth with move ordering off and on.
+parallel: time to search every position at a fixed depth with 1, 2, ... worker processes.
+eval: leaves per second of each mid eval, one leaf at a time and batched per set of siblings (needs numpy).
+quiescence: nodes and time at --depth with quiescence against --against plies without it.
+board: cost per call of the square-by-square Board helpers (rel, adjacent, on_board, legal_moves, ...).
+suite: nodes, time and move played for every method x mid eval x depth on every position, and the
+perft counts of the perft.py positions, saved as a baseline or compared with one (by default the
+committed benchmark_baseline.json). A configuration whose nodes or time grew by more than --threshold
+percent over all positions is a regression and makes the run exit with status 1 (time is only
+checked for configurations that took at least --min-ms in the baseline), and so is a perft count
+that changed. Changed moves are listed but do not fail the run, since an eval change is expected to
+change them. benchmark_baseline.json holds only what is the same on every machine: nodes, moves and
+perft counts, no times (save it with --no-times).
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+from time import perf_counter
+
+import checkers
+import gamebot
+import perft
+
+# the suite's baseline of nodes, moves and perft counts, kept with the code
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# name, side to move, red men, red kings, blue men, blue kings
+POSITIONS = [
+    ('start', checkers.BLUE, checkers.RED_START, 0x0, checkers.BLUE_START, 0x0),
+    ('opening-1', checkers.RED, 0x31011313, 0x0, 0x84b8c8c8, 0x0),
+    ('opening-2', checkers.RED, 0x22333113, 0x0, 0x4ccc0cc8, 0x0),
+    ('opening-3', checkers.BLUE, 0x31071313, 0x0, 0x84e8c8c8, 0x0),
+    ('middlegame-1', checkers.RED, 0x34011123, 0x0, 0x4838c8c4, 0x0),
+    ('middlegame-2', checkers.RED, 0x4130321, 0x0, 0x50cc2484, 0x0),
+    ('middlegame-3', checkers.BLUE, 0x20422113, 0x0, 0x880cc88, 0x1000000),
+    ('middlegame-4', checkers.RED, 0x20020113, 0x0, 0x80ce88, 0x1000000),
+    ('late-1', checkers.RED, 0x1012, 0x800000, 0x1000848c, 0x100000),
+    ('late-2', checkers.RED, 0x22200401, 0x80000, 0x40004084, 0x1000100),
+    ('late-3', checkers.RED, 0x1, 0x80880080, 0x202, 0x11010),
+    ('king-endgame', checkers.RED, 0x0, 0x2004008, 0x0, 0x100200),
+]
+
+
+def search(game, position, seed=0, bot=None, **bot_args):
+    """
+    Plays one bot step from position and returns (nodes, seconds, move played), quiescence nodes
+    included. The random tie-breaks are seeded, so the same bot finds the same move every time.
+    Without a bot a new one is made from bot_args and closed again; a given bot is left open.
+    """
+    name, turn, red_men, red_kings, blue_men, blue_kings = position
+    game.board.set_position(red_men, red_kings, blue_men, blue_kings)
+    game.turn = turn
+    game.hop = False
+    own_bot = bot is None
+    if own_bot:
+        bot = gamebot.Bot(game, turn, **bot_args)
+    random.seed(seed)
+    start = perf_counter()
+    nodes = bot.step(game.board, True) + bot._count_quiescence_nodes
+    seconds = perf_counter() - start
+    if own_bot:
+        bot.close()
+    return nodes, seconds, bot.last_move
+
+
+def ordering(args):
+    game = checkers.Game(loop_mode=True, headless=True)
+    bot_args = dict(method='alpha_beta', mid_eval=args.eval, depth=args.depth, tt_size_mb=args.tt)
+    print('%-14s %12s %12s %8s' % ('position', 'unordered', 'ordered', 'saved'))
+    totals = [0, 0]
+    for position in POSITIONS:
+        unordered, _, _ = search(game, position, move_ordering=False, **bot_args)
+        ordered, _, _ = search(game, position, move_ordering=True, **bot_args)
+        totals[0] += unordered
+        totals[1] += ordered
+        print('%-14s %12d %12d %7.1f%%' % (position[0], unordered, ordered, 100 * (1 - ordered / unordered)))
+    print('%-14s %12d %12d %7.1f%%' % ('total', totals[0], totals[1], 100 * (1 - totals[1] / totals[0])))
+
+
+def parallel(args):
+    game = checkers.Game(loop_mode=True, headless=True)
+    bot_args = dict(method='alpha_beta', mid_eval=args.eval, depth=args.depth, tt_size_mb=args.tt,
+                    move_ordering=True)
+    print('%-8s %12s %10s %8s' % ('workers', 'nodes', 'seconds', 'speedup'))
+    serial = None
+    for workers in range(1, args.max_workers + 1):
+        # one bot per side sharing one pool per worker count, so the pool starts only once
+        bots = {color: gamebot.Bot(game, color, workers=workers, **bot_args)
+                for color in (checkers.RED, checkers.BLUE)}
+        if workers > 1:
+            bots[checkers.BLUE]._pool = bots[checkers.RED]._pool = multiprocessing.Pool(workers)
+        # an untimed warm-up from a position not in the list starts the workers and their bots
+        search(game, ('warm-up', checkers.RED, checkers.RED_START, 0x0, checkers.BLUE_START, 0x0),
+               bot=bots[checkers.RED])
+        search(game, ('warm-up', checkers.BLUE) + game.board.state()[:4], bot=bots[checkers.BLUE])
+        for bot in bots.values():
+            if bot._tt is not None:
+                bot._tt.clear()
+        nodes = seconds = 0
+        for position in POSITIONS:
+            position_nodes, position_seconds, _ = search(game, position, bot=bots[position[1]])
+            nodes += position_nodes
+            seconds += position_seconds
+        bots[checkers.BLUE]._pool = None
+        for bot in bots.values():
+            bot.close()
+        if serial is None:
+            serial = seconds
+        print('%-8d %12d %10.2f %7.2fx' % (workers, nodes, seconds, serial / seconds))
+
+
+def quiescence(args):
+    game = checkers.Game(loop_mode=True, headless=True)
+    bot_args = dict(method='alpha_beta', mid_eval=args.eval, tt_size_mb=args.tt, move_ordering=True)
+    print('%-14s %22s %22s' % ('', 'depth %d + quiescence' % args.depth, 'depth %d' % args.against))
+    print('%-14s %12s %9s %12s %9s' % ('position', 'nodes', 'ms', 'nodes', 'ms'))
+    totals = [0, 0, 0, 0]
+    for position in POSITIONS:
+        quiet_nodes, quiet_seconds, _ = search(game, position, depth=args.depth, quiescence=True,
+                                            max_quiescence=args.max_quiescence, **bot_args)
+        deep_nodes, deep_seconds, _ = search(game, position, depth=args.against, **bot_args)
+        row = [quiet_nodes, 1000 * quiet_seconds, deep_nodes, 1000 * deep_seconds]
+        totals = [total + value for total, value in zip(totals, row)]
+        print('%-14s %12d %9.1f %12d %9.1f' % ((position[0],) + tuple(row)))
+    print('%-14s %12d %9.1f %12d %9.1f' % (('total',) + tuple(totals)))
+
+
+def board_calls(args):
+    board = checkers.Board()
+    squares = [(x, y) for x in range(8) for y in range(8)]
+    calls = [
+        ('rel', lambda x, y: board.rel(checkers.SOUTHEAST, x, y)),
+        ('adjacent', board.adjacent),
+        ('on_board', board.on_board),
+        ('blind_legal_moves', board.blind_legal_moves),
+        ('legal_moves', board.legal_moves),
+        ('legal_moves hop', lambda x, y: board.legal_moves(x, y, True)),
+    ]
+    print('%-20s %10s' % ('call', 'ns/call'))
+    for name, call in calls:
+        count = 0
+        start = perf_counter()
+        for position in POSITIONS:
+            board.set_position(*position[2:])
+            for _ in range(args.repeat):
+                for x, y in squares:
+                    call(x, y)
+            count += args.repeat * len(squares)
+        print('%-20s %10.0f' % (name, 1e9 * (perf_counter() - start) / count))
+
+
+def suite_run(args):
+    """Returns {'method/mid eval/depth': {position name: {'nodes', 'ms', 'move'}}} for every configuration."""
+    game = checkers.Game(loop_mode=True, headless=True)
+    results = {}
+    for method in args.methods.split(','):
+        for mid_eval in args.evals.split(','):
+            for depth in range(1, args.max_depth + 1):
+                bot_args = dict(method=method, mid_eval=mid_eval, depth=depth, tt_size_mb=args.tt,
+                                move_ordering=args.ordering)
+                config = {}
+                for position in POSITIONS:
+                    # the best of --repeat timings; nodes and move are the same every time
+                    timings = []
+                    for _ in range(args.repeat):
+                        nodes, seconds, move = search(game, position, seed=args.seed, **bot_args)
+                        timings.append(seconds)
+                    config[position[0]] = {'nodes': nodes, 'ms': 1000 * min(timings),
+                                           'move': [list(square) for square in move.coords()] if move else None}
+                results['%s/%s/%d' % (method, mid_eval, depth)] = config
+    return results
+
+
+def perft_run(depth):
+    """Returns {'position/forced or default': [perft(1), ..., perft(depth)]} for the perft.py positions."""
+    board = checkers.Board()
+    counts = {}
+    for name, turn, red_men, red_kings, blue_men, blue_kings in perft.POSITIONS:
+        for forced_capture in (False, True):
+            board.set_position(red_men, red_kings, blue_men, blue_kings)
+            counts['%s/%s' % (name, 'forced' if forced_capture else 'default')] = [
+                perft.perft(board, turn, ply, forced_capture) for ply in range(1, depth + 1)]
+    return counts
+
+
+def suite(args):
+    results = suite_run(args)
+    perft_counts = perft_run(args.perft_depth)
+    settings = {name: getattr(args, name) for name in ('methods', 'evals', 'max_depth', 'tt', 'ordering', 'seed')}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        for name in ('tt', 'ordering', 'seed'):
+            value = baseline['settings'][name]
+            if settings[name] != value:
+                print('warning: the baseline was made with %s=%s' % (name, value))
+        print('comparing with', args.baseline)
+
+    print('%-40s %10s %10s %8s %8s' % ('configuration', 'nodes', 'ms', 'nodes', 'time'))
+    regressions = []
+    for name, config in results.items():
+        nodes = sum(result['nodes'] for result in config.values())
+        ms = sum(result['ms'] for result in config.values())
+        before = baseline['results'].get(name) if baseline else None
+        if before is None:
+            print('%-40s %10d %10.1f' % (name, nodes, ms))
+            continue
+        nodes_change = 100 * (nodes / sum(result['nodes'] for result in before.values()) - 1)
+        if not all('ms' in result for result in before.values()):
+            # a baseline without times, made on another machine
+            print('%-40s %10d %10.1f %+7.1f%% %8s' % (name, nodes, ms, nodes_change, '-'))
+        else:
+            ms_change = 100 * (ms / sum(result['ms'] for result in before.values()) - 1)
+            print('%-40s %10d %10.1f %+7.1f%% %+7.1f%%' % (name, nodes, ms, nodes_change, ms_change))
+            # a few milliseconds of timing noise is a large percentage of a short configuration
+            if ms_change > args.threshold and sum(result['ms'] for result in before.values()) >= args.min_ms:
+                regressions.append('%s: %+.1f%% time' % (name, ms_change))
+        if nodes_change > args.threshold:
+            regressions.append('%s: %+.1f%% nodes' % (name, nodes_change))
+        for position, result in config.items():
+            if position in before and result['move'] != before[position]['move']:
+                print('    %s: move changed from %s to %s' % (position, before[position]['move'], result['move']))
+
+    for name, counts in perft_counts.items():
+        before = baseline.get('perft', {}).get(name) if baseline else None
+        if before is not None and counts[:len(before)] != before[:len(counts)]:
+            regressions.append('perft %s: %s, was %s' % (name, counts, before))
+    print('perft to depth %d of %d positions %s' % (
+        args.perft_depth, len(perft_counts), 'checked' if baseline and 'perft' in baseline else 'not checked'))
+
+    if args.save:
+        if args.no_times:
+            for config in results.values():
+                for result in config.values():
+                    del result['ms']
+        with open(args.save, 'w') as file:
+            json.dump({'settings': settings, 'results': results, 'perft': perft_counts}, file, indent=2)
+        print('written to', args.save)
+    if regressions:
+        print('regressions over %g%%:' % args.threshold)
+        for regression in regressions:
+            print('    ' + regression)
+        sys.exit(1)
+
+
+def sibling_leaves(board, turn, depth):
+    """Returns the positions after every move of every node depth plies below board, grouped by node."""
+    moves = board.generate_moves(turn)
+    other = checkers.RED if turn == checkers.BLUE else checkers.BLUE
+    if depth == 0:
+        leaves = []
+        for move in moves:
+            undo = board.make_move(move)
+            leaves.append(board.state()[:4])
+            board.unmake_move(undo)
+        return [leaves] if leaves else []
+    groups = []
+    for move in moves:
+        undo = board.make_move(move)
+        groups += sibling_leaves(board, other, depth - 1)
+        board.unmake_move(undo)
+    return groups
+
+
+def evaluation(args):
+    game = checkers.Game(loop_mode=True, headless=True)
+    groups = []
+    for name, turn, red_men, red_kings, blue_men, blue_kings in POSITIONS:
+        game.board.set_position(red_men, red_kings, blue_men, blue_kings)
+        groups += sibling_leaves(game.board, turn, args.depth)
+    leaves = sum(len(group) for group in groups)
+    print('%d leaves in %d sets of siblings' % (leaves, len(groups)))
+    print('%-20s %14s %14s %8s' % ('eval', 'scalar/s', 'batched/s', 'speedup'))
+    for mid_eval in ('piece2val', 'piece_and_row', 'piece_and_board', 'piece_and_board_pov'):
+        bot = gamebot.Bot(game, checkers.BLUE, method='alpha_beta', mid_eval=mid_eval, batch_eval=True)
+        # the scalar evals read the running totals a search keeps up to date on the board
+        board = game.board
+        totals = [[checkers.count_totals(*leaf) for leaf in group] for group in groups]
+        start = perf_counter()
+        for group in totals:
+            for board.totals in group:
+                bot._mid_eval(board)
+        scalar = perf_counter() - start
+        start = perf_counter()
+        for group in groups:
+            bot._batch_eval(group)
+        batched = perf_counter() - start
+        print('%-20s %14.0f %14.0f %7.2fx' % (mid_eval, leaves / scalar, leaves / batched, scalar / batched))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('ordering', help='nodes at a fixed depth with and without move ordering')
+    command.add_argument('--depth', type=int, default=5)
+    command.add_argument('--eval', default='piece_and_board')
+    command.add_argument('--tt', type=int, default=0, help='transposition table size in MB (0: off)')
+    command.set_defaults(run=ordering)
+
+    command = commands.add_parser('parallel', help='search time with 1 to --max-workers worker processes')
+    command.add_argument('--depth', type=int, default=6)
+    command.add_argument('--eval', default='piece_and_board')
+    command.add_argument('--tt', type=int, default=16, help='transposition table size in MB (0: off)')
+    command.add_argument('--max-workers', type=int, default=os.cpu_count())
+    command.set_defaults(run=parallel)
+
+    command = commands.add_parser('eval', help='leaves per second of the scalar and batched evals')
+    command.add_argument('--depth', type=int, default=2, help='plies below each position to collect leaves at')
+    command.set_defaults(run=evaluation)
+
+    command = commands.add_parser('quiescence', help='nodes with quiescence against a deeper search without')
+    command.add_argument('--depth', type=int, default=3)
+    command.add_argument('--against', type=int, default=5, help='depth of the search without quiescence')
+    command.add_argument('--max-quiescence', type=int, default=8)
+    command.add_argument('--eval', default='piece_and_board')
+    command.add_argument('--tt', type=int, default=16, help='transposition table size in MB (0: off)')
+    command.set_defaults(run=quiescence)
+
+    command = commands.add_parser('board', help='cost per call of the square-by-square Board helpers')
+    command.add_argument('--repeat', type=int, default=50, help='times every square of every position is called')
+    command.set_defaults(run=board_calls)
+
+    command = commands.add_parser('suite', help='every method x eval x depth, against a saved baseline')
+    command.add_argument('--methods', default='minmax,alpha_beta', help='comma separated Bot methods')
+    command.add_argument('--evals', default='piece2val,piece_and_row,piece_and_board,piece_and_board_pov',
+                         help='comma separated mid evals')
+    command.add_argument('--max-depth', type=int, default=4, help='every depth from 1 to this')
+    command.add_argument('--tt', type=int, default=0, help='transposition table size in MB (0: off)')
+    command.add_argument('--ordering', action='store_true', help='turn move ordering on')
+    command.add_argument('--seed', type=int, default=0, help='random seed of every search, for the tie-breaks')
+    command.add_argument('--repeat', type=int, default=3, help='time every search this many times, keep the best')
+    command.add_argument('--baseline', default=BASELINE,
+                         help='baseline JSON to compare with (default: benchmark_baseline.json, "" for none)')
+    command.add_argument('--threshold', type=float, default=10, help='percent more nodes or time that is a regression')
+    command.add_argument('--min-ms', type=float, default=50,
+                         help='only check the time of configurations that took at least this long in the baseline')
+    command.add_argument('--perft-depth', type=int, default=5, help='perft counts up to this depth')
+    command.add_argument('--save', help='write the results as a baseline JSON')
+    command.add_argument('--no-times', action='store_true', help='leave the times out of the saved baseline')
+    command.set_defaults(run=suite)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+book.py
+
+An opening book: for positions seen in the first plies of recorded games, the moves played from them
+and how those games ended. Positions are keyed by Board.zobrist_key() and moves by start << 5 | end,
+the same keys the bot's transposition table uses.
+
+    python3 tournament.py --games 200 --records games.jsonl --bot-a ... --bot-b ...
+    python3 book.py build games.jsonl --plies 16 --output book.bin
+    python3 book.py show book.bin
+
+Game records are JSON lines, {"moves": [[start, [landing squares]], ...], "winner": "red", "blue" or null},
+starting from the usual opening position with BLUE to move. tournament.py --records writes them from
+self-play; records from anywhere else can be built into a book the same way.
+
+File layout (little-endian): a header b'CKBK', version (H), entry count (I), then the entries sorted
+by position key and move key, each: position key (Q), move key (H), games, wins, draws, losses (I),
+the results counted for the side that played the move. Lookups binary-search the sorted entries.
+"""
+
+import argparse
+import json
+import mmap
+import struct
+from collections import namedtuple
+
+from engine import GameState, RED, BLUE
+
+MAGIC = b'CKBK'
+VERSION = 1
+HEADER = struct.Struct('<4sHI')
+ENTRY = struct.Struct('<QHIIII')
+
+BookEntry = namedtuple('BookEntry', ['key', 'move', 'games', 'wins', 'draws', 'losses'])
+
+
+def move_key(move):
+    """start << 5 | end, as Bot._move_key(). Two jump chains between the same squares share a key."""
+    return move.start << 5 | move.end
+
+
+class OpeningBook:
+    """A book file mapped into memory and searched in place."""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.size = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a version %d opening book' % (path, VERSION))
+
+    def _entry(self, index):
+        return BookEntry(*ENTRY.unpack_from(self._map, HEADER.size + index * ENTRY.size))
+
+    def _key(self, index):
+        return struct.unpack_from('<Q', self._map, HEADER.size + index * ENTRY.size)[0]
+
+    def lookup(self, key):
+        """Returns the BookEntry of every move stored for the position with key, in move key order."""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.size and self._key(low) == key:
+            entries.append(self._entry(low))
+            low += 1
+        return entries
+
+    def entries(self):
+        for index in range(self.size):
+            yield self._entry(index)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def replay(record, plies):
+    """Yields (position key, move key, color to move) for the first plies moves of a game record."""
+    game = GameState()
+    for start, path in record['moves'][:plies]:
+        path = tuple(path)
+        for move in game.board.generate_moves(game.turn, game.forced_capture):
+            if move.start == start and move.path == path:
+                break
+        else:
+            raise ValueError('illegal move %r in game record' % ([start, list(path)],))
+        yield game.board.zobrist_key(game.turn), move_key(move), game.turn
+        game.board.make_move(move)
+        game.turn = RED if game.turn == BLUE else BLUE
+
+
+def build_book(records, plies, min_games=1):
+    """Returns the sorted BookEntry list for the first plies moves of records."""
+    stats = {}
+    for record in records:
+        winner = {'red': RED, 'blue': BLUE}.get(record['winner'])
+        for key, move, turn in replay(record, plies):
+            games, wins, draws, losses = stats.get((key, move), (0, 0, 0, 0))
+            stats[(key, move)] = (games + 1, wins + (winner == turn), draws + (winner is None),
+                                  losses + (winner is not None and winner != turn))
+    return [BookEntry(key, move, *counts) for (key, move), counts in sorted(stats.items()) if counts[0] >= min_games]
+
+
+def write_book(entries, path):
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(entries)))
+        for entry in entries:
+            file.write(ENTRY.pack(*entry))
+
+
+def build(args):
+    records = []
+    for path in args.records:
+        with open(path) as file:
+            records += [json.loads(line) for line in file if line.strip()]
+    entries = build_book(records, args.plies, args.min_games)
+    write_book(entries, args.output)
+    print('%d games, %d positions, %d entries written to %s' % (
+        len(records), len({entry.key for entry in entries}), len(entries), args.output))
+
+
+def show(args):
+    book = OpeningBook(args.file)
+    for entry in book.entries():
+        print('%016x move %2d-%2d  games %5d  wins %5d  draws %5d  losses %5d' % (
+            entry.key, entry.move >> 5, entry.move & 31, entry.games, entry.wins, entry.draws, entry.losses))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('build', help='build a book from game records')
+    command.add_argument('records', nargs='+', help='game record files (JSON lines)')
+    command.add_argument('--plies', type=int, default=16, help='how many plies of each game go into the book')
+    command.add_argument('--min-games', type=int, default=1, help='leave out moves played in fewer games')
+    command.add_argument('--output', default='book.bin')
+    command.set_defaults(run=build)
+
+    command = commands.add_parser('show', help='print every entry of a book')
+    command.add_argument('file')
+    command.set_defaults(run=show)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -38,43 +38,39 @@ Everest Witman - May 2014 - Marlboro College - Programming Workshop
 
 import pygame, sys
 from pygame.locals import *
-from time import sleep
+from time import sleep, perf_counter
+from engine import *
 
 pygame.font.init()
 
 ##COLORS##
 #             R    G    B
-WHITE    = (255, 255, 255)
-BLUE     = (  0,   0, 255)
-RED      = (255,   0,   0)
-BLACK    = (  0,   0,   0)
 GOLD     = (255, 215,   0)
 HIGH     = (160, 190, 255)
 
-##DIRECTIONS##
-NORTHWEST = "northwest"
-NORTHEAST = "northeast"
-SOUTHWEST = "southwest"
-SOUTHEAST = "southeast"
-
 class Game:
 	"""
 	The main game control.
 	"""
 
-	def __init__(self, loop_mode):
-		self.graphics = Graphics()
+	def __init__(self, loop_mode, forced_capture = False, headless = False):
+		self.graphics = None if headless else Graphics() # headless games have no window and no frame clock
 		self.board = Board()
 		self.endit = False
 		self.turn = BLUE
 		self.selected_piece = None # a board location.
 		self.hop = False
 		self.loop_mode = loop_mode
+		self.forced_capture = forced_capture # must a player jump when they can?
 		self.selected_legal_moves = []
+		self.piece_moves = [] # the complete moves of the selected piece that agree with the hops made so far
+		self.hops = 0 # how many hops of the current jump have been made
+		self.moves_cache = (None, []) # (board masks and turn, complete moves of the side to move); see turn_moves()
 
 	def setup(self):
 		"""Draws the window and board at the beginning of the game"""
-		self.graphics.setup_window()
+		if self.graphics is not None:
+			self.graphics.setup_window()
 
 	def player_turn(self):
 		"""
@@ -83,48 +79,61 @@ class Game:
 		"""
 		mouse_pos = tuple(map(int, pygame.mouse.get_pos()))
 		self.mouse_pos = tuple(map(int, self.graphics.board_coords(mouse_pos[0], mouse_pos[1]))) # what square is the mouse in?
-		if self.selected_piece != None:
-			self.selected_legal_moves = self.board.legal_moves(self.selected_piece[0], self.selected_piece[1], self.hop)
-			 #print("selected_legal_moves: ", self.selected_legal_moves)
 
 		for event in pygame.event.get():
 
 			if event.type == QUIT:
 				self.terminate_game()
 
+			if event.type == VIDEOEXPOSE:
+				self.graphics.redraw()
+
 			if event.type == MOUSEBUTTONDOWN:
 				# print(self.hop)
-				if self.hop == False:
-					if self.board.location(self.mouse_pos[0], self.mouse_pos[1]).occupant != None and self.board.location(self.mouse_pos[0], self.mouse_pos[1]).occupant.color == self.turn:
+				if self.hop == False and self.board.location(self.mouse_pos[0], self.mouse_pos[1]).occupant != None and self.board.location(self.mouse_pos[0], self.mouse_pos[1]).occupant.color == self.turn:
+					self.selected_piece = self.mouse_pos
+					start = SQUARE_BITS[self.mouse_pos]
+					self.piece_moves = [move for move in self.turn_moves() if move.start == start]
+					self.selected_legal_moves = self.next_squares()
+
+				elif self.selected_piece != None and self.mouse_pos in self.selected_legal_moves:
+					end = SQUARE_BITS[self.mouse_pos]
+					self.board.move_square(SQUARE_BITS[self.selected_piece], end)
+					self.piece_moves = [move for move in self.piece_moves if move.path[self.hops] == end]
+					self.hops += 1
+
+					if len(self.piece_moves[0].path) > self.hops: # the jump goes on
+						self.hop = True
 						self.selected_piece = self.mouse_pos
-
-					elif self.selected_piece != None and self.mouse_pos in self.board.legal_moves(self.selected_piece[0], self.selected_piece[1]):
-
-						self.board.move_piece(self.selected_piece[0], self.selected_piece[1], self.mouse_pos[0], self.mouse_pos[1])
-
-						if self.mouse_pos not in self.board.adjacent(self.selected_piece[0], self.selected_piece[1]):
-							self.board.remove_piece(self.selected_piece[0] + (self.mouse_pos[0] - self.selected_piece[0]) // 2, self.selected_piece[1] + (self.mouse_pos[1] - self.selected_piece[1]) // 2)
-
-							self.hop = True
-							self.selected_piece = self.mouse_pos
-						else:
-							self.end_turn()
-
-				if self.hop == True:
-					if self.selected_piece != None and self.mouse_pos in self.board.legal_moves(self.selected_piece[0], self.selected_piece[1], self.hop):
-						self.board.move_piece(self.selected_piece[0], self.selected_piece[1], self.mouse_pos[0], self.mouse_pos[1])
-						self.board.remove_piece(self.selected_piece[0] + (self.mouse_pos[0] - self.selected_piece[0]) // 2, self.selected_piece[1] + (self.mouse_pos[1] - self.selected_piece[1]) // 2)
-
-					if self.board.legal_moves(self.mouse_pos[0], self.mouse_pos[1], self.hop) == []:
-							self.end_turn()
-
+						self.selected_legal_moves = self.next_squares()
 					else:
-						self.selected_piece = self.mouse_pos
+						self.end_turn()
+
+	def turn_moves(self):
+		"""
+		Returns the complete moves of the side to move. They are generated once per turn and kept
+		until the board or the turn changes, so the event loop can ask for them every frame.
+		"""
+		key = (self.turn, self.board.red_men, self.board.red_kings, self.board.blue_men, self.board.blue_kings)
+		if self.moves_cache[0] != key:
+			self.moves_cache = (key, self.board.generate_moves(self.turn, self.forced_capture))
+		return self.moves_cache[1]
 
+	def next_squares(self):
+		"""
+		Returns the squares the selected piece can move to next, as board coordinates.
+		"""
+		next_squares = []
+		for move in self.piece_moves:
+			square = SQUARES[move.path[self.hops]]
+			if square not in next_squares:
+				next_squares.append(square)
+		return next_squares
 
 	def update(self):
 		"""Calls on the graphics class to update the game display."""
-		self.graphics.update_display(self.board, self.selected_legal_moves, self.selected_piece)
+		if self.graphics is not None:
+			self.graphics.update_display(self.board, self.selected_legal_moves, self.selected_piece)
 
 	def terminate_game(self):
 		"""Quits the program and ends the game."""
@@ -151,15 +160,15 @@ class Game:
 
 		self.selected_piece = None
 		self.selected_legal_moves = []
+		self.piece_moves = []
+		self.hops = 0
 		self.hop = False
 
 		if self.check_for_endgame():
-			if self.turn == BLUE:
-				print('RED WINS!')
-				self.graphics.draw_message("RED WINS!")
-			else:
-				print('BLUE WINS!')
-				self.graphics.draw_message("BLUE WINS!")
+			message = "RED WINS!" if self.turn == BLUE else "BLUE WINS!"
+			print(message)
+			if self.graphics is not None:
+				self.graphics.draw_message(message)
 			print(self.turn)
 			if(self.loop_mode):
 				self.endit = True
@@ -169,16 +178,19 @@ class Game:
 	def check_for_endgame(self):
 		"""
 		Checks to see if a player has run out of moves or pieces. If so, then return True. Else return False.
+		The moves found are kept for the turn (see turn_moves()).
 		"""
-		for x in range(8):
-			for y in range(8):
-				if self.board.location(x, y).color == BLACK and self.board.location(x, y).occupant != None and self.board.location(x, y).occupant.color == self.turn:
-					if self.board.legal_moves(x, y) != []:
-						return False
-
-		return True
+		return not self.turn_moves()
 
 class Graphics:
+	"""
+	Draws the board to the window. A frame redraws only the squares whose piece or highlight changed
+	since the last one, from the background image and pre-rendered piece sprites, and updates only
+	those parts of the screen. Set dirty_rects to False to redraw and update everything every frame.
+	"""
+
+	dirty_rects = True
+
 	def __init__(self):
 		self.caption = "Checkers"
 
@@ -193,6 +205,15 @@ class Graphics:
 		self.piece_size = self.square_size // 2
 
 		self.message = False
+		self.message_drawn = False
+
+		self.sprites = {(color, king): self.piece_sprite(color, king) for color in (RED, BLUE) for king in (False, True)}
+		self.drawn = None # (the board's masks, highlighted squares mask) of the last frame; None to redraw everything
+
+		# frame time spent drawing, without the wait for the frame clock
+		self.frames = 0
+		self.frame_seconds = 0.0
+		self.regions_drawn = 0
 
 	def setup_window(self):
 		"""
@@ -201,21 +222,93 @@ class Graphics:
 		pygame.init()
 		pygame.display.set_caption(self.caption)
 
+	def piece_sprite(self, color, king):
+		"""
+		Returns a square sized, transparent surface with a piece of color drawn in the middle, crowned if king.
+		"""
+		sprite = pygame.Surface((self.square_size, self.square_size), SRCALPHA)
+		center = (self.piece_size, self.piece_size)
+		pygame.draw.circle(sprite, color, center, int(self.piece_size))
+		if king:
+			pygame.draw.circle(sprite, GOLD, center, int(self.piece_size // 1.7), self.piece_size // 4)
+		return sprite
+
+	def redraw(self):
+		"""
+		Makes the next frame redraw and update the whole window.
+		"""
+		self.drawn = None
+
 	def update_display(self, board, legal_moves, selected_piece):
 		"""
 		This updates the current display.
 		"""
-		self.screen.blit(self.background, (0,0))
+		start = perf_counter()
+		masks = (board.red_men, board.red_kings, board.blue_men, board.blue_kings)
+		highlighted = 0
+		for square in legal_moves:
+			highlighted |= 1 << SQUARE_BITS[tuple(square)]
+		if selected_piece != None:
+			highlighted |= 1 << SQUARE_BITS[tuple(selected_piece)]
 
-		self.highlight_squares(legal_moves, selected_piece)
-		self.draw_board_pieces(board)
+		if self.drawn is None or not self.dirty_rects:
+			self.screen.blit(self.background, (0,0))
 
-		if self.message:
-			self.screen.blit(self.text_surface_obj, self.text_rect_obj)
+			self.highlight_squares(legal_moves, selected_piece)
+			self.draw_board_pieces(board)
 
-		pygame.display.update()
+			if self.message:
+				self.screen.blit(self.text_surface_obj, self.text_rect_obj)
+				self.message_drawn = True
+
+			pygame.display.update()
+			self.regions_drawn += 64
+		else:
+			changed = highlighted ^ self.drawn[1]
+			for drawn, mask in zip(self.drawn[0], masks):
+				changed |= drawn ^ mask
+			rects = []
+			while changed:
+				bit = (changed & -changed).bit_length() - 1
+				changed &= changed - 1
+				rects.append(self.draw_square(bit, masks, highlighted >> bit & 1))
+			if self.message and (not self.message_drawn or self.text_rect_obj.collidelist(rects) != -1):
+				self.screen.blit(self.text_surface_obj, self.text_rect_obj)
+				self.message_drawn = True
+				rects.append(self.text_rect_obj)
+			if rects:
+				pygame.display.update(rects)
+			self.regions_drawn += len(rects)
+		self.drawn = (masks, highlighted)
+
+		self.frames += 1
+		self.frame_seconds += perf_counter() - start
 		self.clock.tick(self.fps)
 
+	def draw_square(self, bit, masks, highlighted):
+		"""
+		Redraws the dark square with bit from the background, its highlight and the sprite of its piece
+		in masks (red men, red kings, blue men, blue kings). Returns the square's rectangle.
+		"""
+		x, y = SQUARES[bit]
+		rect = pygame.Rect(x * self.square_size, y * self.square_size, self.square_size, self.square_size)
+		self.screen.blit(self.background, rect, rect)
+		if highlighted:
+			pygame.draw.rect(self.screen, HIGH, rect)
+		for (color, king), mask in zip(((RED, False), (RED, True), (BLUE, False), (BLUE, True)), masks):
+			if mask >> bit & 1:
+				self.screen.blit(self.sprites[(color, king)], rect)
+		return rect
+
+	def frame_stats(self):
+		"""
+		Returns the frames drawn so far, the milliseconds spent drawing each on average (the wait
+		for the frame clock left out) and the screen regions updated per frame, 64 for a full redraw.
+		"""
+		frames = max(self.frames, 1)
+		return {'frames': self.frames, 'ms_per_frame': 1000 * self.frame_seconds / frames,
+				'regions_per_frame': self.regions_drawn / frames}
+
 	def draw_board_squares(self, board):
 		"""
 		Takes a board object and draws all of its squares to the display
@@ -230,13 +323,9 @@ class Graphics:
 		"""
 		for x in range(8):
 			for y in range(8):
-				if board.matrix[x][y].occupant != None:
-					pygame.draw.circle(self.screen, board.matrix[x][y].occupant.color, tuple(map(int, self.pixel_coords((x, y)))), int(self.piece_size))
-
-					if board.location(x,y).occupant.king == True:
-						 #print("228->", self.screen, GOLD, self.pixel_coords((x, y)), self.piece_size // 1.7, self.piece_size // 4)
-						pygame.draw.circle(self.screen, GOLD, self.pixel_coords((x, y)), int(self.piece_size // 1.7), self.piece_size // 4)
-
+				occupant = board.location(x, y).occupant
+				if occupant != None:
+					self.screen.blit(self.sprites[(occupant.color, occupant.king)], (x * self.square_size, y * self.square_size))
 
 	def pixel_coords(self, board_coords):
 		"""
@@ -268,259 +357,8 @@ class Graphics:
 		"""
 		print("in here")
 		self.message = True
+		self.message_drawn = False
 		self.font_obj = pygame.font.Font('freesansbold.ttf', 44)
 		self.text_surface_obj = self.font_obj.render(message, True, HIGH, BLACK)
 		self.text_rect_obj = self.text_surface_obj.get_rect()
 		self.text_rect_obj.center = (self.window_size // 2, self.window_size // 2)
-
-class Board:
-	def __init__(self):
-		self.matrix = self.new_board()
-
-	def new_board(self):
-		"""
-		Create a new board matrix.
-		"""
-
-		# initialize squares and place them in matrix
-
-		matrix = [[None] * 8 for i in range(8)]
-
-		# The following code block has been adapted from
-		# http://itgirl.dreamhosters.com/itgirlgames/games/Program%20Leaders/ClareR/Checkers/checkers.py
-		for x in range(8):
-			for y in range(8):
-				if (x % 2 != 0) and (y % 2 == 0):
-					matrix[y][x] = Square(WHITE)
-				elif (x % 2 != 0) and (y % 2 != 0):
-					matrix[y][x] = Square(BLACK)
-				elif (x % 2 == 0) and (y % 2 != 0):
-					matrix[y][x] = Square(WHITE)
-				elif (x % 2 == 0) and (y % 2 == 0):
-					matrix[y][x] = Square(BLACK)
-
-		# initialize the pieces and put them in the appropriate squares
-
-		for x in range(8):
-			for y in range(3):
-				if matrix[x][y].color == BLACK:
-					matrix[x][y].occupant = Piece(RED)
-			for y in range(5, 8):
-				if matrix[x][y].color == BLACK:
-					matrix[x][y].occupant = Piece(BLUE)
-
-		return matrix
-
-	def board_string(self, board):
-		"""
-		Takes a board and returns a matrix of the board space colors. Used for testing new_board()
-		"""
-
-		board_string = [[None] * 8] * 8
-
-		for x in range(8):
-			for y in range(8):
-				if board[x][y].color == WHITE:
-					board_string[x][y] = "WHITE"
-				else:
-					board_string[x][y] = "BLACK"
-
-
-		return board_string
-
-	def rel(self, dir, x, y):
-		"""
-		Returns the coordinates one square in a different direction to (x,y).
-
-		===DOCTESTS===
-
-		>>> board = Board()
-
-		>>> board.rel(NORTHWEST, (1,2))
-		(0,1)
-
-		>>> board.rel(SOUTHEAST, (3,4))
-		(4,5)
-
-		>>> board.rel(NORTHEAST, (3,6))
-		(4,5)
-
-		>>> board.rel(SOUTHWEST, (2,5))
-		(1,6)
-		"""
-		if dir == NORTHWEST:
-			return (x - 1, y - 1)
-		elif dir == NORTHEAST:
-			return (x + 1, y - 1)
-		elif dir == SOUTHWEST:
-			return (x - 1, y + 1)
-		elif dir == SOUTHEAST:
-			return (x + 1, y + 1)
-		else:
-			return 0
-
-	def adjacent(self, x, y):
-		"""
-		Returns a list of squares locations that are adjacent (on a diagonal) to (x,y).
-		"""
-
-		return [self.rel(NORTHWEST, x,y), self.rel(NORTHEAST, x,y),self.rel(SOUTHWEST, x,y),self.rel(SOUTHEAST, x,y)]
-
-	def location(self, x, y):
-		"""
-		Takes a set of coordinates as arguments and returns self.matrix[x][y]
-		This can be faster than writing something like self.matrix[coords[0]][coords[1]]
-		"""
-		x = int(x)
-		y = int(y)
-		return self.matrix[x][y]
-
-	def blind_legal_moves(self, x, y):
-		"""
-		Returns a list of blind legal move locations from a set of coordinates (x,y) on the board.
-		If that location is empty, then blind_legal_moves() return an empty list.
-		"""
-		 #print(x)
-		if self.matrix[x][y].occupant != None:
-
-			if self.matrix[x][y].occupant.king == False and self.matrix[x][y].occupant.color == BLUE:
-				blind_legal_moves = [self.rel(NORTHWEST, x, y), self.rel(NORTHEAST, x, y)]
-
-			elif self.matrix[x][y].occupant.king == False and self.matrix[x][y].occupant.color == RED:
-				blind_legal_moves = [self.rel(SOUTHWEST, x, y), self.rel(SOUTHEAST, x, y)]
-
-			else:
-				blind_legal_moves = [self.rel(NORTHWEST, x, y), self.rel(NORTHEAST, x, y), self.rel(SOUTHWEST, x, y), self.rel(SOUTHEAST, x, y)]
-
-		else:
-			blind_legal_moves = []
-
-		return blind_legal_moves
-
-	def legal_moves(self, x, y, hop = False):
-		"""
-		Returns a list of legal move locations from a given set of coordinates (x,y) on the board.
-		If that location is empty, then legal_moves() returns an empty list.
-		"""
-		 #print(x, y)
-		blind_legal_moves = self.blind_legal_moves(x, y)
-		# print('BLind Legal moves', blind_legal_moves)
-		legal_moves = []
-
-		if hop == False:
-			for move in blind_legal_moves:
-				if hop == False:
-					if self.on_board(move[0], move[1]):
-						if self.location(move[0], move[1]).occupant == None:
-							legal_moves.append(move)
-
-						elif self.location(move[0], move[1]).occupant.color != self.location(x, y).occupant.color and self.on_board(move[0] + (move[0] - x), move[1] + (move[1] - y)) and self.location(move[0] + (move[0] - x), move[1] + (move[1] - y)).occupant == None: # is this location filled by an enemy piece?
-							legal_moves.append((move[0] + (move[0] - x), move[1] + (move[1] - y)))
-
-		else: # hop == True
-			for move in blind_legal_moves:
-				if self.on_board(move[0], move[1]) and self.location(move[0], move[1]).occupant != None:
-					if self.location(move[0], move[1]).occupant.color != self.location(x, y).occupant.color and self.on_board(move[0] + (move[0] - x), move[1] + (move[1] - y)) and self.location(move[0] + (move[0] - x), move[1] + (move[1] - y)).occupant == None: # is this location filled by an enemy piece?
-						legal_moves.append((move[0] + (move[0] - x), move[1] + (move[1] - y)))
-
-		return legal_moves
-
-	def remove_piece(self, x, y):
-		"""
-		Removes a piece from the board at position (x,y).
-		"""
-		self.matrix[x][y].occupant = None
-
-	def move_piece(self, start_x, start_y, end_x, end_y):
-		"""
-		Move a piece from (start_x, start_y) to (end_x, end_y).
-		"""
-
-		self.matrix[end_x][end_y].occupant = self.matrix[start_x][start_y].occupant
-		self.remove_piece(start_x, start_y)
-
-		self.king(end_x, end_y)
-
-	def is_end_square(self, coords):
-		"""
-		Is passed a coordinate tuple (x,y), and returns true or
-		false depending on if that square on the board is an end square.
-
-		===DOCTESTS===
-
-		>>> board = Board()
-
-		>>> board.is_end_square((2,7))
-		True
-
-		>>> board.is_end_square((5,0))
-		True
-
-		>>>board.is_end_square((0,5))
-		False
-		"""
-
-		if coords[1] == 0 or coords[1] == 7:
-			return True
-		else:
-			return False
-
-	def on_board(self, x, y):
-		"""
-		Checks to see if the given square (x,y) lies on the board.
-		If it does, then on_board() return True. Otherwise it returns false.
-
-		===DOCTESTS===
-		>>> board = Board()
-
-		>>> board.on_board((5,0)):
-		True
-
-		>>> board.on_board(-2, 0):
-		False
-
-		>>> board.on_board(3, 9):
-		False
-		"""
-
-		if x < 0 or y < 0 or x > 7 or y > 7:
-			return False
-		else:
-			return True
-
-
-	def king(self, x, y):
-		"""
-		Takes in (x,y), the coordinates of square to be considered for kinging.
-		If it meets the criteria, then king() kings the piece in that square and kings it.
-		"""
-		if self.location(x, y).occupant != None:
-			if (self.location(x, y).occupant.color == BLUE and y == 0) or (self.location(x, y).occupant.color == RED and y == 7):
-				self.location(x, y).occupant.crown()
-
-	def repr_matrix(self):
-		for j in range(8):
-			for i in range(8):
-				if self.matrix[i][j].occupant is not None:
-					if self.matrix[i][j].occupant.color == BLUE:
-						print('B', end=" ")
-					else:
-						print('R', end=" ")
-				else:
-					print('X', end=" ")
-			print('')
-
-class Piece:
-	def __init__(self, color, king = False):
-		self.color = color
-		self.king = king
-		self.value = 1
-
-	def crown(self):
-		self.king = True
-		self.value = 2
-
-class Square:
-	def __init__(self, color, occupant = None):
-		self.color = color # color is either BLACK or WHITE
-		self.occupant = occupant # occupant is a Square object
\ No newline at end of file
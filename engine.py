@@ -0,0 +1,725 @@
+"""
+engine.py
+
+The checkers rules with no pygame in sight: the board, its pieces and move generation.
+checkers.py builds the game window on top of this, and the bot searches with it directly,
+so self-play and servers can run it on machines without a display.
+"""
+
+import random
+from collections import namedtuple
+
+##COLORS##
+#             R    G    B
+WHITE    = (255, 255, 255)
+BLUE     = (  0,   0, 255)
+RED      = (255,   0,   0)
+BLACK    = (  0,   0,   0)
+
+##DIRECTIONS##
+NORTHWEST = "northwest"
+NORTHEAST = "northeast"
+SOUTHWEST = "southwest"
+SOUTHEAST = "southeast"
+
+DIRECTIONS = (NORTHWEST, NORTHEAST, SOUTHWEST, SOUTHEAST)
+FORWARD = {RED: (SOUTHWEST, SOUTHEAST), BLUE: (NORTHWEST, NORTHEAST)}
+BACKWARD = {NORTHWEST: SOUTHEAST, NORTHEAST: SOUTHWEST, SOUTHWEST: NORTHEAST, SOUTHEAST: NORTHWEST}
+STEPS = {NORTHWEST: (-1, -1), NORTHEAST: (1, -1), SOUTHWEST: (-1, 1), SOUTHEAST: (1, 1)}
+
+##BITBOARDS##
+# Only the 32 dark squares can hold a piece. They are numbered column by column, so square (x, y)
+# is bit 4 * x + y // 2 and walking a mask from its lowest bit upwards visits the pieces in the
+# same x-then-y order as a nested "for x ... for y ..." scan of the board.
+SQUARES = [(x, y) for x in range(8) for y in range(8) if (x + y) % 2 == 0]
+SQUARE_BITS = {square: bit for bit, square in enumerate(SQUARES)}
+
+def square_mask(condition):
+	"""Returns the mask of every dark square (x, y) for which condition(x, y) is true."""
+	mask = 0
+	for bit, (x, y) in enumerate(SQUARES):
+		if condition(x, y):
+			mask |= 1 << bit
+	return mask
+
+FULL_MASK = (1 << 32) - 1
+EVEN_COLUMNS = square_mask(lambda x, y: x % 2 == 0)
+ODD_COLUMNS = FULL_MASK ^ EVEN_COLUMNS
+ROW_MASKS = [square_mask(lambda x, y, row=row: y == row) for row in range(8)]
+TOP_HALF = square_mask(lambda x, y: y < 4)
+BOTTOM_HALF = FULL_MASK ^ TOP_HALF
+RED_START = square_mask(lambda x, y: y < 3)
+BLUE_START = square_mask(lambda x, y: y >= 5)
+CROWN_ROW = {RED: ROW_MASKS[7], BLUE: ROW_MASKS[0]}
+
+# NEIGHBOURS[direction][bit] is the square one step away in that direction (None off the board),
+# and HAS_NEIGHBOUR[direction] masks the squares for which it exists.
+NEIGHBOURS = {}
+HAS_NEIGHBOUR = {}
+for direction, (dx, dy) in STEPS.items():
+	NEIGHBOURS[direction] = [SQUARE_BITS.get((x + dx, y + dy)) for x, y in SQUARES]
+	HAS_NEIGHBOUR[direction] = square_mask(lambda x, y, dx=dx, dy=dy: (x + dx, y + dy) in SQUARE_BITS)
+
+# JUMPS[direction][bit] is the square two steps away in that direction (None off the board), where a
+# jump lands, and JUMPED[(start, end)] is the square a jump from start to end passes over.
+JUMPS = {}
+JUMPED = {}
+for direction in DIRECTIONS:
+	JUMPS[direction] = [None if over is None else NEIGHBOURS[direction][over] for over in NEIGHBOURS[direction]]
+	for bit, over in enumerate(NEIGHBOURS[direction]):
+		if JUMPS[direction][bit] is not None:
+			JUMPED[(bit, JUMPS[direction][bit])] = over
+
+# PIECE_MOVES[(color, king)][bit] has, for every direction that piece may move in (in PIECE_DIRECTIONS
+# order) and that has a square next to bit, the pair (step, landing): the square it steps to, which is
+# also the square a jump passes over, and the square that jump lands on (None off the board).
+# BLIND_MOVES[(color, king)][bit] is the square one step away in each of those directions, on the board or not.
+PIECE_DIRECTIONS = {(RED, False): FORWARD[RED], (BLUE, False): FORWARD[BLUE], (RED, True): DIRECTIONS, (BLUE, True): DIRECTIONS}
+PIECE_MOVES = {}
+BLIND_MOVES = {}
+for kind, directions in PIECE_DIRECTIONS.items():
+	PIECE_MOVES[kind] = [tuple((NEIGHBOURS[direction][bit], JUMPS[direction][bit]) for direction in directions
+		if NEIGHBOURS[direction][bit] is not None) for bit in range(32)]
+	BLIND_MOVES[kind] = [tuple((x + STEPS[direction][0], y + STEPS[direction][1]) for direction in directions) for x, y in SQUARES]
+
+# ADJACENT[(x, y)] is the four diagonal neighbours of every square, light ones included, in DIRECTIONS order.
+ADJACENT = {(x, y): tuple((x + STEPS[direction][0], y + STEPS[direction][1]) for direction in DIRECTIONS) for x in range(8) for y in range(8)}
+
+# How far a bit moves for one diagonal step, as (from an even column, from an odd column).
+SHIFTS = {NORTHWEST: (-5, -4), NORTHEAST: (3, 4), SOUTHWEST: (-4, -3), SOUTHEAST: (4, 5)}
+
+def shift(mask, direction):
+	"""
+	Moves every square of mask one diagonal step in direction. Squares that would leave the board are dropped.
+	"""
+	mask &= HAS_NEIGHBOUR[direction]
+	even, odd = SHIFTS[direction]
+	even_part = mask & EVEN_COLUMNS
+	odd_part = mask & ODD_COLUMNS
+	even_part = even_part << even if even > 0 else even_part >> -even
+	odd_part = odd_part << odd if odd > 0 else odd_part >> -odd
+	return even_part | odd_part
+
+def bits(mask):
+	"""Yields the square numbers set in mask, lowest first."""
+	while mask:
+		low = mask & -mask
+		yield low.bit_length() - 1
+		mask ^= low
+
+##ZOBRIST KEYS##
+# One random 64-bit key per (piece kind, square) and one for "red to move". A position's key is the
+# XOR of the keys of everything on it, so a move updates it by XORing out and in the squares it touches.
+zobrist_random = random.Random(2014)
+ZOBRIST_RED_MEN = [zobrist_random.getrandbits(64) for bit in range(32)]
+ZOBRIST_RED_KINGS = [zobrist_random.getrandbits(64) for bit in range(32)]
+ZOBRIST_BLUE_MEN = [zobrist_random.getrandbits(64) for bit in range(32)]
+ZOBRIST_BLUE_KINGS = [zobrist_random.getrandbits(64) for bit in range(32)]
+ZOBRIST_RED_TO_MOVE = zobrist_random.getrandbits(64)
+
+def zobrist_hash(red_men, red_kings, blue_men, blue_kings):
+	"""Computes the Zobrist key of a position from scratch."""
+	key = 0
+	for mask, keys in ((red_men, ZOBRIST_RED_MEN), (red_kings, ZOBRIST_RED_KINGS), (blue_men, ZOBRIST_BLUE_MEN), (blue_kings, ZOBRIST_BLUE_KINGS)):
+		for bit in bits(mask):
+			key ^= keys[bit]
+	return key
+
+def row_sum(mask):
+	"""Returns the sum of the row numbers (y) of the squares in mask."""
+	return sum(row * (mask & ROW_MASKS[row]).bit_count() for row in range(1, 8))
+
+##RUNNING TOTALS##
+# Board.totals keeps, for each color, what the bot's evals count: men, kings, the sum of the rows
+# of all its pieces and its men in the top half (y < 4). Moves update them square by square.
+# TOTALS[color] + MEN, KINGS, ROWS or TOP_MEN indexes the list.
+MEN, KINGS, ROWS, TOP_MEN = range(4)
+TOTALS = {RED: 0, BLUE: 4}
+SQUARE_ROWS = [y for x, y in SQUARES]
+SQUARE_TOP = [1 if y < 4 else 0 for x, y in SQUARES]
+
+def count_totals(red_men, red_kings, blue_men, blue_kings):
+	"""Computes Board.totals of a position from scratch."""
+	totals = []
+	for men, kings in ((red_men, red_kings), (blue_men, blue_kings)):
+		totals += [men.bit_count(), kings.bit_count(), row_sum(men | kings), (men & TOP_HALF).bit_count()]
+	return totals
+
+class Move(namedtuple('Move', ['start', 'path', 'captured'])):
+	"""
+	A complete move: the square it starts on, the squares it lands on in order (one for a step,
+	one per hop for a jump) and the squares of the pieces it captures. Squares are bit numbers (see SQUARES).
+	"""
+	__slots__ = ()
+
+	@property
+	def end(self):
+		return self.path[-1]
+
+	def coords(self):
+		"""Returns the move as a list of (x, y) board coordinates, starting square first."""
+		return [SQUARES[self.start]] + [SQUARES[bit] for bit in self.path]
+
+class Position(namedtuple('Position', ['turn', 'red_men', 'red_kings', 'blue_men', 'blue_kings'])):
+	"""
+	A position as plain values: the side to move and the four masks of Board.set_position().
+	"""
+	__slots__ = ()
+
+class Board:
+	"""
+	The position is stored as four 32-bit masks over the dark squares (see SQUARES):
+	red men, red kings, blue men and blue kings. matrix and location() build Square and
+	Piece views from the masks on demand, so code that reads the board square by square
+	keeps working, while the bot generates and plays moves on the masks directly.
+
+	Set check_totals to compare the running totals with a full recount after every move and take-back.
+	"""
+
+	check_totals = False
+
+	def __init__(self):
+		self.new_board()
+
+	def new_board(self):
+		"""
+		Sets up the starting position.
+		"""
+		self.set_position(RED_START, 0, BLUE_START, 0)
+
+	def set_position(self, red_men, red_kings, blue_men, blue_kings):
+		"""
+		Replaces the position with the one given by the four masks.
+		"""
+		self.red_men = red_men
+		self.red_kings = red_kings
+		self.blue_men = blue_men
+		self.blue_kings = blue_kings
+		self.zobrist = zobrist_hash(red_men, red_kings, blue_men, blue_kings)
+		self.totals = count_totals(red_men, red_kings, blue_men, blue_kings)
+
+	def position(self, turn):
+		"""
+		Returns the position with turn to move as a Position.
+		"""
+		return Position(turn, self.red_men, self.red_kings, self.blue_men, self.blue_kings)
+
+	def total(self, color, kind):
+		"""
+		Returns the running total kind (MEN, KINGS, ROWS or TOP_MEN) of color.
+		"""
+		return self.totals[TOTALS[color] + kind]
+
+	def verify_totals(self):
+		"""
+		Raises AssertionError if the running totals differ from a recount of the masks.
+		"""
+		expected = count_totals(self.red_men, self.red_kings, self.blue_men, self.blue_kings)
+		assert self.totals == expected, 'running totals %r, recounted %r' % (self.totals, expected)
+
+	@property
+	def matrix(self):
+		"""
+		An 8x8 matrix of Square views of the board, indexed matrix[x][y].
+		"""
+		return [[self.location(x, y) for y in range(8)] for x in range(8)]
+
+	def board_string(self, board):
+		"""
+		Takes a board and returns a matrix of the board space colors. Used for testing new_board()
+		"""
+
+		board_string = [[None] * 8] * 8
+
+		for x in range(8):
+			for y in range(8):
+				if board[x][y].color == WHITE:
+					board_string[x][y] = "WHITE"
+				else:
+					board_string[x][y] = "BLACK"
+
+
+		return board_string
+
+	def rel(self, dir, x, y):
+		"""
+		Returns the coordinates one square in a different direction to (x,y).
+
+		===DOCTESTS===
+
+		>>> board = Board()
+
+		>>> board.rel(NORTHWEST, (1,2))
+		(0,1)
+
+		>>> board.rel(SOUTHEAST, (3,4))
+		(4,5)
+
+		>>> board.rel(NORTHEAST, (3,6))
+		(4,5)
+
+		>>> board.rel(SOUTHWEST, (2,5))
+		(1,6)
+		"""
+		step = STEPS.get(dir)
+		if step is None:
+			return 0
+		return (x + step[0], y + step[1])
+
+	def adjacent(self, x, y):
+		"""
+		Returns a list of squares locations that are adjacent (on a diagonal) to (x,y).
+		"""
+		adjacent = ADJACENT.get((x, y))
+		if adjacent is None:
+			return [self.rel(direction, x, y) for direction in DIRECTIONS]
+		return list(adjacent)
+
+	def location(self, x, y):
+		"""
+		Takes a set of coordinates as arguments and returns a Square view of that location.
+		Changing the view does not change the board, use move_piece(), remove_piece() and king() for that.
+		"""
+		x = int(x)
+		y = int(y)
+		bit = SQUARE_BITS.get((x, y))
+		if bit is None:
+			return Square(WHITE)
+
+		square = 1 << bit
+		if self.red_men & square:
+			return Square(BLACK, Piece(RED))
+		elif self.red_kings & square:
+			return Square(BLACK, Piece(RED, True))
+		elif self.blue_men & square:
+			return Square(BLACK, Piece(BLUE))
+		elif self.blue_kings & square:
+			return Square(BLACK, Piece(BLUE, True))
+		return Square(BLACK)
+
+	def men(self, color):
+		"""Returns the mask of color's uncrowned pieces."""
+		return self.red_men if color == RED else self.blue_men
+
+	def kings(self, color):
+		"""Returns the mask of color's kings."""
+		return self.red_kings if color == RED else self.blue_kings
+
+	def pieces(self, color):
+		"""Returns the mask of all of color's pieces."""
+		return self.red_men | self.red_kings if color == RED else self.blue_men | self.blue_kings
+
+	def occupied(self):
+		"""Returns the mask of every occupied square."""
+		return self.red_men | self.red_kings | self.blue_men | self.blue_kings
+
+	def zobrist_key(self, turn):
+		"""
+		Returns the Zobrist key of the position with turn to move. self.zobrist covers the pieces only.
+		"""
+		return self.zobrist ^ ZOBRIST_RED_TO_MOVE if turn == RED else self.zobrist
+
+	def piece_kind(self, bit):
+		"""
+		Returns (color, king) of the piece on square bit, or None if the square is empty.
+		"""
+		square = 1 << bit
+		if self.red_men & square:
+			return (RED, False)
+		elif self.red_kings & square:
+			return (RED, True)
+		elif self.blue_men & square:
+			return (BLUE, False)
+		elif self.blue_kings & square:
+			return (BLUE, True)
+		return None
+
+	def blind_legal_moves(self, x, y):
+		"""
+		Returns a list of blind legal move locations from a set of coordinates (x,y) on the board.
+		If that location is empty, then blind_legal_moves() return an empty list.
+		"""
+		bit = SQUARE_BITS.get((x, y))
+		kind = None if bit is None else self.piece_kind(bit)
+		if kind is None:
+			return []
+		return list(BLIND_MOVES[kind][bit])
+
+	def legal_moves(self, x, y, hop = False):
+		"""
+		Returns a list of legal move locations from a given set of coordinates (x,y) on the board.
+		If that location is empty, then legal_moves() returns an empty list.
+		"""
+		bit = SQUARE_BITS.get((x, y))
+		kind = None if bit is None else self.piece_kind(bit)
+		if kind is None:
+			return []
+
+		occupied = self.occupied()
+		enemies = self.pieces(BLUE if kind[0] == RED else RED)
+		legal_moves = []
+		for step, landing in PIECE_MOVES[kind][bit]:
+			if not occupied >> step & 1:
+				if hop == False:
+					legal_moves.append(SQUARES[step])
+			elif enemies >> step & 1 and landing is not None and not occupied >> landing & 1: # is this location filled by an enemy piece?
+				legal_moves.append(SQUARES[landing])
+		return legal_moves
+
+	def all_legal_moves(self, color, hop = False):
+		"""
+		Returns [(x, y, legal_moves(x, y, hop)), ...] for every piece of color that has a legal move, in x-then-y order.
+
+		The work is done on whole masks: for each direction every piece that may move that way is shifted at once,
+		which gives the pieces that can step and the pieces that can jump in that direction.
+		"""
+		men = self.men(color)
+		kings = self.kings(color)
+		enemies = self.pieces(RED if color == BLUE else BLUE)
+		empty = ~(men | kings | enemies) & FULL_MASK
+
+		steps = []
+		jumps = []
+		for direction in DIRECTIONS:
+			movers = men | kings if direction in FORWARD[color] else kings
+			back = BACKWARD[direction]
+			steps.append(0 if hop else movers & shift(empty, back))
+			jumps.append(movers & shift(enemies & shift(empty, back), back))
+
+		all_legal_moves = []
+		for bit in bits(steps[0] | steps[1] | steps[2] | steps[3] | jumps[0] | jumps[1] | jumps[2] | jumps[3]):
+			square = 1 << bit
+			legal_moves = []
+			for i, direction in enumerate(DIRECTIONS):
+				if steps[i] & square:
+					legal_moves.append(SQUARES[NEIGHBOURS[direction][bit]])
+				elif jumps[i] & square:
+					legal_moves.append(SQUARES[NEIGHBOURS[direction][NEIGHBOURS[direction][bit]]])
+			all_legal_moves.append(SQUARES[bit] + (legal_moves,))
+
+		return all_legal_moves
+
+	def generate_moves(self, color, forced_capture = False):
+		"""
+		Returns every complete Move color can make, in x-then-y order of the starting square.
+		A jump is followed through every branch of its chain: each way of continuing is its own Move.
+		With forced_capture, only jumps are returned when there are any.
+		"""
+		moves = []
+		jumps = []
+		for x, y, legal_moves in self.all_legal_moves(color):
+			start = SQUARE_BITS[(x, y)]
+			for square in legal_moves:
+				end = SQUARE_BITS[square]
+				if (start, end) in JUMPED:
+					for path, captured in self.jump_paths(start, end):
+						jump = Move(start, path, captured)
+						moves.append(jump)
+						jumps.append(jump)
+				else:
+					moves.append(Move(start, (end,), ()))
+
+		if forced_capture and jumps != []:
+			return jumps
+		return moves
+
+	def generate_jumps(self, color):
+		"""
+		Returns only the jumps of generate_moves(color), in the same order.
+		"""
+		jumps = []
+		for x, y, legal_moves in self.all_legal_moves(color, hop = True):
+			start = SQUARE_BITS[(x, y)]
+			for square in legal_moves:
+				for path, captured in self.jump_paths(start, SQUARE_BITS[square]):
+					jumps.append(Move(start, path, captured))
+		return jumps
+
+	def jump_paths(self, start, end):
+		"""
+		Returns [(path, captured), ...] for every way the jump from square start to square end can be continued.
+		A piece that is crowned on the way keeps jumping as a king.
+		"""
+		undo = self.state()
+		captured = self.move_square(start, end)
+		square_jumps = self.square_jumps(end)
+		if square_jumps == []:
+			jump_paths = [((end,), (captured,))]
+		else:
+			jump_paths = []
+			for landing in square_jumps:
+				for path, more_captured in self.jump_paths(end, landing):
+					jump_paths.append(((end,) + path, (captured,) + more_captured))
+		self.unmake_move(undo)
+		return jump_paths
+
+	def has_legal_moves(self, color):
+		"""
+		Returns True if any piece of color can move.
+		"""
+		men = self.men(color)
+		kings = self.kings(color)
+		enemies = self.pieces(RED if color == BLUE else BLUE)
+		empty = ~(men | kings | enemies) & FULL_MASK
+
+		for direction in DIRECTIONS:
+			movers = men | kings if direction in FORWARD[color] else kings
+			back = BACKWARD[direction]
+			if movers & (shift(empty, back) | shift(enemies & shift(empty, back), back)):
+				return True
+		return False
+
+	def square_jumps(self, bit):
+		"""
+		Returns the squares the piece on square bit can land on by jumping, in the same order as legal_moves().
+		"""
+		kind = self.piece_kind(bit)
+		if kind is None:
+			return []
+
+		occupied = self.occupied()
+		enemies = self.pieces(BLUE if kind[0] == RED else RED)
+		square_jumps = []
+		for over, landing in PIECE_MOVES[kind][bit]:
+			if enemies >> over & 1 and landing is not None and not occupied >> landing & 1:
+				square_jumps.append(landing)
+		return square_jumps
+
+	def move_square(self, start, end):
+		"""
+		Moves the piece on square start to square end and kings it if it reached the far row.
+		If the move is a jump, the piece jumped over is removed and its square is returned. Otherwise returns None.
+		"""
+		self.slide_square(start, end)
+		self.king_square(end)
+
+		jumped = JUMPED.get((start, end))
+		if jumped is not None:
+			self.remove_square(jumped)
+		return jumped
+
+	def slide_square(self, start, end):
+		"""
+		Moves the piece on square start to square end, without kinging or capturing anything.
+		"""
+		start_mask = 1 << start
+		end_mask = 1 << end
+		if self.red_men & start_mask:
+			self.red_men ^= start_mask | end_mask
+			self.zobrist ^= ZOBRIST_RED_MEN[start] ^ ZOBRIST_RED_MEN[end]
+			offset, kind = TOTALS[RED], MEN
+		elif self.red_kings & start_mask:
+			self.red_kings ^= start_mask | end_mask
+			self.zobrist ^= ZOBRIST_RED_KINGS[start] ^ ZOBRIST_RED_KINGS[end]
+			offset, kind = TOTALS[RED], KINGS
+		elif self.blue_men & start_mask:
+			self.blue_men ^= start_mask | end_mask
+			self.zobrist ^= ZOBRIST_BLUE_MEN[start] ^ ZOBRIST_BLUE_MEN[end]
+			offset, kind = TOTALS[BLUE], MEN
+		elif self.blue_kings & start_mask:
+			self.blue_kings ^= start_mask | end_mask
+			self.zobrist ^= ZOBRIST_BLUE_KINGS[start] ^ ZOBRIST_BLUE_KINGS[end]
+			offset, kind = TOTALS[BLUE], KINGS
+		else:
+			return
+		self.totals[offset + ROWS] += SQUARE_ROWS[end] - SQUARE_ROWS[start]
+		if kind == MEN:
+			self.totals[offset + TOP_MEN] += SQUARE_TOP[end] - SQUARE_TOP[start]
+
+	def king_square(self, bit):
+		"""
+		Crowns the man on square bit if it is on the far row for its color.
+		"""
+		square = 1 << bit
+		if self.red_men & square & CROWN_ROW[RED]:
+			self.red_men ^= square
+			self.red_kings |= square
+			self.zobrist ^= ZOBRIST_RED_MEN[bit] ^ ZOBRIST_RED_KINGS[bit]
+			offset = TOTALS[RED]
+		elif self.blue_men & square & CROWN_ROW[BLUE]:
+			self.blue_men ^= square
+			self.blue_kings |= square
+			self.zobrist ^= ZOBRIST_BLUE_MEN[bit] ^ ZOBRIST_BLUE_KINGS[bit]
+			offset = TOTALS[BLUE]
+		else:
+			return
+		self.totals[offset + MEN] -= 1
+		self.totals[offset + KINGS] += 1
+		self.totals[offset + TOP_MEN] -= SQUARE_TOP[bit]
+
+	def make_move(self, move):
+		"""
+		Plays a complete Move. Returns an undo record for unmake_move(), which also restores
+		captured pieces and un-kings the piece if it was crowned.
+		"""
+		undo = self.state()
+		start = move.start
+		for end in move.path:
+			self.move_square(start, end)
+			start = end
+		if self.check_totals:
+			self.verify_totals()
+		return undo
+
+	def unmake_move(self, undo):
+		"""
+		Takes back the move make_move() returned undo for.
+		"""
+		self.red_men, self.red_kings, self.blue_men, self.blue_kings, self.zobrist, totals = undo
+		self.totals = list(totals)
+		if self.check_totals:
+			self.verify_totals()
+
+	def state(self):
+		"""
+		Returns the position as a tuple of the four masks, the Zobrist key and the running totals.
+		Equal positions have equal states.
+		"""
+		return (self.red_men, self.red_kings, self.blue_men, self.blue_kings, self.zobrist, tuple(self.totals))
+
+	def remove_square(self, bit):
+		"""
+		Removes whatever piece is on square bit.
+		"""
+		square = 1 << bit
+		if self.red_men & square:
+			self.red_men ^= square
+			self.zobrist ^= ZOBRIST_RED_MEN[bit]
+			offset, kind = TOTALS[RED], MEN
+		elif self.red_kings & square:
+			self.red_kings ^= square
+			self.zobrist ^= ZOBRIST_RED_KINGS[bit]
+			offset, kind = TOTALS[RED], KINGS
+		elif self.blue_men & square:
+			self.blue_men ^= square
+			self.zobrist ^= ZOBRIST_BLUE_MEN[bit]
+			offset, kind = TOTALS[BLUE], MEN
+		elif self.blue_kings & square:
+			self.blue_kings ^= square
+			self.zobrist ^= ZOBRIST_BLUE_KINGS[bit]
+			offset, kind = TOTALS[BLUE], KINGS
+		else:
+			return
+		self.totals[offset + kind] -= 1
+		self.totals[offset + ROWS] -= SQUARE_ROWS[bit]
+		if kind == MEN:
+			self.totals[offset + TOP_MEN] -= SQUARE_TOP[bit]
+
+	def remove_piece(self, x, y):
+		"""
+		Removes a piece from the board at position (x,y).
+		"""
+		self.remove_square(SQUARE_BITS[(x, y)])
+
+	def move_piece(self, start_x, start_y, end_x, end_y):
+		"""
+		Move a piece from (start_x, start_y) to (end_x, end_y).
+		"""
+		self.slide_square(SQUARE_BITS[(start_x, start_y)], SQUARE_BITS[(end_x, end_y)])
+		self.king(end_x, end_y)
+
+	def is_end_square(self, coords):
+		"""
+		Is passed a coordinate tuple (x,y), and returns true or
+		false depending on if that square on the board is an end square.
+
+		===DOCTESTS===
+
+		>>> board = Board()
+
+		>>> board.is_end_square((2,7))
+		True
+
+		>>> board.is_end_square((5,0))
+		True
+
+		>>>board.is_end_square((0,5))
+		False
+		"""
+
+		if coords[1] == 0 or coords[1] == 7:
+			return True
+		else:
+			return False
+
+	def on_board(self, x, y):
+		"""
+		Checks to see if the given square (x,y) lies on the board.
+		If it does, then on_board() return True. Otherwise it returns false.
+
+		===DOCTESTS===
+		>>> board = Board()
+
+		>>> board.on_board((5,0)):
+		True
+
+		>>> board.on_board(-2, 0):
+		False
+
+		>>> board.on_board(3, 9):
+		False
+		"""
+
+		if x < 0 or y < 0 or x > 7 or y > 7:
+			return False
+		else:
+			return True
+
+
+	def king(self, x, y):
+		"""
+		Takes in (x,y), the coordinates of square to be considered for kinging.
+		If it meets the criteria, then king() kings the piece in that square and kings it.
+		"""
+		self.king_square(SQUARE_BITS[(x, y)])
+
+	def repr_matrix(self):
+		for j in range(8):
+			for i in range(8):
+				occupant = self.location(i, j).occupant
+				if occupant is not None:
+					if occupant.color == BLUE:
+						print('B', end=" ")
+					else:
+						print('R', end=" ")
+				else:
+					print('X', end=" ")
+			print('')
+
+class GameState:
+	"""
+	A board, whose turn it is and the rules in play, without any window.
+	It has the attributes and end_turn() that the bot uses from checkers.Game, so a bot can search
+	and play on one where there is no display, like worker processes and servers.
+	"""
+
+	def __init__(self, board = None, turn = BLUE, forced_capture = False):
+		self.board = board if board is not None else Board()
+		self.turn = turn
+		self.hop = False
+		self.forced_capture = forced_capture
+		self.endit = False
+
+	def end_turn(self):
+		"""
+		Switches the current player and checks whether they have lost.
+		"""
+		self.turn = RED if self.turn == BLUE else BLUE
+		self.hop = False
+		if not self.board.has_legal_moves(self.turn):
+			self.endit = True
+
+class Piece:
+	def __init__(self, color, king = False):
+		self.color = color
+		self.king = king
+		self.value = 2 if king else 1
+
+	def crown(self):
+		self.king = True
+		self.value = 2
+
+class Square:
+	def __init__(self, color, occupant = None):
+		self.color = color # color is either BLACK or WHITE
+		self.occupant = occupant # occupant is a Square object
@@ -1,11 +1,20 @@
-import pygame
 import sys
-from pygame.locals import *
+import json
 import random
-from copy import deepcopy
 import math
-from time import sleep
-pygame.font.init()
+import multiprocessing
+import threading
+from array import array
+from collections import namedtuple
+from time import sleep, perf_counter
+from engine import Board, GameState, SQUARES, TOTALS, MEN, KINGS, ROWS, TOP_MEN, bits
+from tablebase import Tablebase, WIN, DRAW
+from book import OpeningBook
+
+try:
+    import numpy as np
+except ImportError:  # only needed for batch_eval
+    np = None
 
 
 ##COLORS##
@@ -24,9 +33,172 @@ SOUTHWEST = "southwest"
 SOUTHEAST = "southeast"
 
 
+# deepest iteration the time-limited search will start
+MAX_DEPTH = 30
+
+# score of a won tablebase position, less the plies it takes to win, so shorter wins score higher
+TB_WIN = 10000
+
+##BOUNDS##
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+# what Bot.analyze() found: the best move (None if there is none), its score, the principal variation
+# as a list of moves starting with it, the nodes searched and the depth
+Analysis = namedtuple('Analysis', ['move', 'score', 'pv', 'nodes', 'depth'])
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time budget of a time-limited step runs out."""
+
+
+class TranspositionTable:
+    """
+    A fixed-size table of alpha-beta results keyed by Board.zobrist_key().
+
+    Entries live in flat arrays sized from a memory budget in megabytes, indexed by the low bits of the key.
+    When two positions want the same slot, the new result replaces the stored one if the stored one is
+    from an earlier search or was searched less deeply; otherwise the deeper, current result is kept.
+    """
+
+    # key (Q) + score (d) + best move (h) + depth (b) + bound (B) + search age (B)
+    ENTRY_BYTES = 8 + 8 + 2 + 1 + 1 + 1
+
+    def __init__(self, size_mb):
+        entries = 1
+        while entries * 2 * self.ENTRY_BYTES <= size_mb * 1024 * 1024:
+            entries *= 2
+        self.size = entries
+        self._index_mask = entries - 1
+        self._keys = array('Q', bytes(8 * entries))
+        self._scores = array('d', bytes(8 * entries))
+        self._moves = array('h', bytes(2 * entries))
+        self._depths = array('b', bytes(entries))
+        self._bounds = array('B', bytes(entries))
+        self._ages = array('B', bytes(entries))
+        self.age = 1
+
+    def new_search(self):
+        # age 0 marks an empty slot
+        self.age = self.age % 255 + 1
+
+    def clear(self):
+        self._ages = array('B', bytes(self.size))
+
+    def probe(self, key):
+        index = key & self._index_mask
+        if self._ages[index] == 0 or self._keys[index] != key:
+            return None
+        return self._depths[index], self._bounds[index], self._scores[index], self._moves[index]
+
+    def store(self, key, depth, bound, score, move):
+        index = key & self._index_mask
+        if self._ages[index] == self.age and self._keys[index] != key and self._depths[index] > depth:
+            return
+        self._keys[index] = key
+        self._scores[index] = score
+        self._moves[index] = move
+        self._depths[index] = depth
+        self._bounds[index] = bound
+        self._ages[index] = self.age
+
+
+class SearchStats:
+    """
+    What one Bot.step(board, return_stats=True) did: nodes per ply (the root's children are ply 1),
+    leaf evaluations, cutoffs and the index in the move list of the move that caused each one, the
+    re-searches of method='pvs', the transposition table and tablebase counters, and the time spent in total, in the evals and in move
+    generation. A beta cutoff happens at a max node, an alpha cutoff at a min node.
+    Time in the workers of a parallel bot is added up over the workers.
+    """
+
+    def __init__(self, color, method):
+        self.color = 'RED' if color == RED else 'BLUE'
+        self.method = method
+        self.depth = 0
+        self.nodes = 0
+        self.nodes_per_ply = [0]
+        self.quiescence_nodes = 0
+        self.leaf_evals = 0
+        self.beta_cutoffs = 0
+        self.alpha_cutoffs = 0
+        self.cutoff_index = []
+        self.researches = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_cutoffs = 0
+        self.tb_hits = 0
+        self.from_book = False
+        self.ponder_hit = False
+        self.seconds = 0.0
+        self.eval_seconds = 0.0
+        self.movegen_calls = 0
+        self.movegen_seconds = 0.0
+
+    def count_node(self, ply):
+        if ply >= len(self.nodes_per_ply):
+            self.nodes_per_ply.extend([0] * (ply + 1 - len(self.nodes_per_ply)))
+        self.nodes_per_ply[ply] += 1
+
+    def count_cutoff(self, maximizing, index):
+        if maximizing:
+            self.beta_cutoffs += 1
+        else:
+            self.alpha_cutoffs += 1
+        if index >= len(self.cutoff_index):
+            self.cutoff_index.extend([0] * (index + 1 - len(self.cutoff_index)))
+        self.cutoff_index[index] += 1
+
+    def merge(self, other):
+        # adds the counts of a worker's stats (a dict from as_dict()) to these
+        for counts, other_counts in ((self.nodes_per_ply, other['nodes_per_ply']),
+                                     (self.cutoff_index, other['cutoff_index'])):
+            counts.extend([0] * (len(other_counts) - len(counts)))
+            for index, count in enumerate(other_counts):
+                counts[index] += count
+        for field in ('quiescence_nodes', 'leaf_evals', 'beta_cutoffs', 'alpha_cutoffs', 'researches', 'tt_probes',
+                      'tt_hits', 'tt_cutoffs', 'tb_hits', 'eval_seconds', 'movegen_calls', 'movegen_seconds'):
+            setattr(self, field, getattr(self, field) + other[field])
+
+    def nodes_per_second(self):
+        return self.nodes / self.seconds if self.seconds else 0.0
+
+    def branching_factor(self):
+        """Effective branching factor: b such that b ** depth = nodes."""
+        if self.depth < 1 or self.nodes < 1:
+            return 0.0
+        return self.nodes ** (1 / self.depth)
+
+    def first_move_cutoffs(self):
+        """Share of the cutoffs caused by the first move searched, a measure of move ordering."""
+        cutoffs = sum(self.cutoff_index)
+        return self.cutoff_index[0] / cutoffs if cutoffs else 0.0
+
+    def as_dict(self):
+        stats = dict(vars(self))
+        stats['nodes_per_second'] = self.nodes_per_second()
+        stats['branching_factor'] = self.branching_factor()
+        stats['first_move_cutoffs'] = self.first_move_cutoffs()
+        return stats
+
+    def to_json(self):
+        """The stats as one line of JSON, for appending to a JSON lines file."""
+        return json.dumps(self.as_dict())
+
+
 class Bot:
-    def __init__(self, game, color, method='random', mid_eval=None, end_eval=None, depth=1):
+    def __init__(self, game, color, method='random', mid_eval=None, end_eval=None, depth=1, tt_size_mb=0, time_limit_ms=None, move_ordering=False, workers=1, batch_eval=False, tablebase=None,
+                 book=None, book_depth=10, quiescence=False, max_quiescence=8, aspiration_window=1,
+                 ponder=False):
         self.method = method
+        # what a worker process needs to build the same bot
+        self._config = dict(method=method, mid_eval=mid_eval, end_eval=end_eval, depth=depth,
+                            tt_size_mb=tt_size_mb, move_ordering=move_ordering, batch_eval=batch_eval,
+                            tablebase=tablebase, book=book, book_depth=book_depth,
+                            quiescence=quiescence, max_quiescence=max_quiescence,
+                            aspiration_window=aspiration_window)
         if mid_eval == 'piece2val':
             self._mid_eval = self._piece2val
         elif mid_eval == 'piece_and_board':
@@ -52,553 +224,792 @@ class Bot:
         self._current_eval = self._mid_eval
         self._end_eval_time = False
         self._count_nodes = 0
+        # transposition table, only used by alpha_beta
+        self._tt = TranspositionTable(tt_size_mb) if tt_size_mb else None
+        self._count_tt_probes = 0
+        self._count_tt_hits = 0
+        self._count_tt_cutoffs = 0
+        # with a time limit alpha_beta deepens 1, 2, 3, ... plies instead of searching to self.depth
+        self.time_limit_ms = time_limit_ms
+        self._deadline = None
+        self._depth_reached = 0
+        # principal variation of the last completed iteration as [(zobrist key, move), ...] and
+        # the triangular table the search builds the next one in
+        self._pv = []
+        self._pv_table = [[] for _ in range(MAX_DEPTH + 2)]
+        # move ordering: jumps, then the PV/TT move, then killer moves, then the history table.
+        # Moves are keyed by _move_key(), history per color as well.
+        self.move_ordering = move_ordering
+        self._killers = [[] for _ in range(MAX_DEPTH + 2)]
+        self._history = [0] * 2048
+        # with more than one worker, fixed-depth alpha_beta splits the root moves over a process pool
+        self.workers = workers
+        self._pool = None
+        # with batch_eval the leaves below a node are scored together by NumPy from per-square
+        # weights, one weight per square of red men, red kings, blue men and blue kings. It is off by
+        # default: with the few siblings of a node the NumPy call costs more than the scalar evals,
+        # which only read the board's running totals (2-30x slower, see benchmark.py eval)
+        self.batch_eval = batch_eval
+        self._pov_eval = mid_eval == 'piece_and_board_pov'
+        self._leaf_weights = None
+        if batch_eval:
+            if np is None:
+                raise ImportError('batch_eval needs numpy')
+            self._leaf_weights = self._eval_weights(mid_eval)
+        # kings-only positions the tablebase file (see tablebase.py) covers are scored from it, exactly
+        self._tablebase = None
+        self._count_tb_hits = 0
+        if tablebase:
+            self._tablebase = Tablebase(tablebase)
+            if self._tablebase.forced_capture != game.forced_capture:
+                raise ValueError('%s was built for forced_capture=%s' % (tablebase, self._tablebase.forced_capture))
+        # for its first book_depth moves the bot plays from the opening book file (see book.py) when
+        # the position is in it, picking among the book moves at random, weighted by games played
+        self._book = OpeningBook(book) if book else None
+        self.book_depth = book_depth
+        self._book_moves = 0
+        self._from_book = False
+        self.last_move = None
+        # with quiescence a depth-0 position where a jump is possible is not evaluated as it stands:
+        # jumps are searched on, up to max_quiescence more plies, until neither side can jump
+        self.quiescence = quiescence
+        self.max_quiescence = max_quiescence
+        self._count_quiescence_nodes = 0
+        # method='pvs' is alpha_beta with principal variation search: every move after the first is
+        # searched with a null window first. With a time limit each iteration also starts from a window
+        # of aspiration_window around the score of the one before.
+        self.aspiration_window = aspiration_window
+        # with ponder, after each searched move the bot guesses the reply (from its principal variation or
+        # the transposition table) and searches the position after it in a background thread until its
+        # next step. If the guess was right that step plays the ponder result, otherwise the ponder
+        # search is stopped. The ponder search shares this bot's transposition table.
+        self.ponder = ponder
+        self._ponder_bot = None
+        self._ponder_thread = None
+        self._ponder_position = None
+        self._ponder_hit = False
+        # set on a ponder bot: the deadline it searches to, changed from the other thread under the lock
+        self._ponder_lock = threading.Lock()
+        self._ponder_until = float('inf')
+        self._ponder_start = None
+        self._ponder_move = None
+        # SearchStats of the step in progress, only collected for step(board, return_stats=True)
+        self._stats = None
 
-    def step(self, board, return_count_nodes=False):
-        self._count_nodes = 0
+    def step(self, board, return_count_nodes=False, return_depth=False, return_stats=False):
+        ponder = self._stop_pondering(board)
+        self._ponder_hit = ponder is not None
+        self._new_search()
         if(self._end_eval is not None and self._end_eval_time == False):
             if self._all_kings(board):
                 print('END EVAL is on')
                 self._end_eval_time = True
                 self._current_eval = self._end_eval
-        if self.method == 'random':
-            self._random_step(board)
-        elif self.method == 'minmax':
-            self._minmax_step(board)
-        elif self.method == 'alpha_beta':
-            self._alpha_beta_step(board)
+                if self._tt is not None:
+                    # scores from the mid game eval are not comparable any more
+                    self._tt.clear()
+        if return_stats:
+            start = perf_counter()
+            self._start_stats()
+        try:
+            book_move = None if self._ponder_hit else self._book_move(board)
+            if self._ponder_hit:
+                self._count_nodes = ponder._count_nodes
+                self._depth_reached = ponder._depth_reached
+                self._pv = ponder._pv
+                self._action(ponder._ponder_move, board)
+            elif book_move is not None:
+                self._from_book = True
+                self._action(book_move, board)
+            elif self.method == 'random':
+                self._random_step(board)
+            elif self.method == 'minmax':
+                self._minmax_step(board)
+            elif self.method in ('alpha_beta', 'pvs') and self.workers > 1 and self.time_limit_ms is None:
+                self._parallel_alpha_beta_step(board)
+            elif self.method in ('alpha_beta', 'pvs'):
+                self._alpha_beta_step(board)
+        finally:
+            if return_stats:
+                stats = self._stop_stats()
+                stats.seconds = perf_counter() - start
+        if self.ponder and self.method in ('alpha_beta', 'pvs') and (self._book is None or self._book_moves >= self.book_depth):
+            self._start_pondering(board)
+        if return_stats:
+            return stats
+        if return_count_nodes and return_depth:
+            return self._count_nodes, self._depth_reached
         if return_count_nodes:
             return self._count_nodes
+        if return_depth:
+            return self._depth_reached
 
-    def _action(self, current_pos, final_pos, board):
-        if current_pos is None:
-            self.game.end_turn()
-            # board.repr_matrix()
-            # print(self._generate_all_possible_moves(board))
-        # print(current_pos, final_pos, board.location(current_pos[0], current_pos[1]).occupant)
-        if self.game.hop == False:
-            if board.location(final_pos[0], final_pos[1]).occupant != None and board.location(final_pos[0], final_pos[1]).occupant.color == self.game.turn:
-                current_pos = final_pos
-
-            elif current_pos != None and final_pos in board.legal_moves(current_pos[0], current_pos[1]):
-
-                board.move_piece(
-                    current_pos[0], current_pos[1], final_pos[0], final_pos[1])
-
-                if final_pos not in board.adjacent(current_pos[0], current_pos[1]):
-                    board.remove_piece(current_pos[0] + (final_pos[0] - current_pos[0]) //
-                                       2, current_pos[1] + (final_pos[1] - current_pos[1]) // 2)
-
-                    self.game.hop = True
-                    current_pos = final_pos
-                    final_pos = board.legal_moves(
-                        current_pos[0], current_pos[1], True)
-                    if final_pos != []:
-                        # print("HOP in Action", current_pos, final_pos)
-                        self._action(current_pos, final_pos[0], board)
-                    self.game.end_turn()
-
-        if self.game.hop == True:
-            if current_pos != None and final_pos in board.legal_moves(current_pos[0], current_pos[1], self.game.hop):
-                board.move_piece(
-                    current_pos[0], current_pos[1], final_pos[0], final_pos[1])
-                board.remove_piece(current_pos[0] + (final_pos[0] - current_pos[0]) //
-                                   2, current_pos[1] + (final_pos[1] - current_pos[1]) // 2)
-
-            if board.legal_moves(final_pos[0], final_pos[1], self.game.hop) == []:
-                self.game.end_turn()
-            else:
-                current_pos = final_pos
-                final_pos = board.legal_moves(
-                    current_pos[0], current_pos[1], True)
-                if final_pos != []:
-                    # print("HOP in Action", current_pos, final_pos)
-                    self._action(current_pos, final_pos[0], board)
-                self.game.end_turn()
-        if self.game.hop != True:
-            self.game.turn = self.adversary_color
-
-    def _action_on_board(self, board, current_pos, final_pos, hop=False):
-        if hop == False:
-            if board.location(final_pos[0], final_pos[1]).occupant != None and board.location(final_pos[0], final_pos[1]).occupant.color == self.game.turn:
-                current_pos = final_pos
-
-            elif current_pos != None and final_pos in board.legal_moves(current_pos[0], current_pos[1]):
-
-                board.move_piece(
-                    current_pos[0], current_pos[1], final_pos[0], final_pos[1])
-
-                if final_pos not in board.adjacent(current_pos[0], current_pos[1]):
-                    # print("REMOVE", current_pos, final_pos)
-                    board.remove_piece(current_pos[0] + (final_pos[0] - current_pos[0]) //
-                                       2, current_pos[1] + (final_pos[1] - current_pos[1]) // 2)
-                    hop = True
-                    current_pos = final_pos
-                    final_pos = board.legal_moves(current_pos[0], current_pos[1], True)
-                    if final_pos != []:
-                        # print("HOP in Action", current_pos, final_pos)
-                        self._action_on_board(board, current_pos, final_pos[0],hop=True)
+    def _new_search(self):
+        # resets the per-search counters and tables before a step or an analysis
+        self._count_nodes = 0
+        self._depth_reached = 0
+        self._pv = []
+        self._killers = [[] for _ in range(MAX_DEPTH + 2)]
+        self._history = [value // 2 for value in self._history]
+        self._count_tt_probes = 0
+        self._count_tt_hits = 0
+        self._count_tt_cutoffs = 0
+        self._count_tb_hits = 0
+        self._count_quiescence_nodes = 0
+        self._from_book = False
+        if self._tt is not None:
+            self._tt.new_search()
+
+    def analyze(self, board, depth=None):
+        """
+        Searches the position on board, with this bot's color to move, the way an alpha_beta (or pvs)
+        step would, with the bot's current eval, and returns an Analysis without playing the move:
+        board and game are left as they were. depth overrides the bot's depth; without one a
+        time-limited bot deepens until its time is up. The score is from this bot's point of view.
+        """
+        if self.game.turn != self.color:
+            raise ValueError('analyze() needs the bot\'s color to move')
+        self._stop_pondering()
+        self._new_search()
+        if depth is None and self.time_limit_ms is not None:
+            best_move, score = self._iterative_deepening(board)
+            pv = [move for _, move in self._pv]
         else:
-            # print(current_pos, final_pos)
-            if current_pos != None and final_pos in board.legal_moves(current_pos[0], current_pos[1], hop):
-                board.move_piece(current_pos[0], current_pos[1], final_pos[0], final_pos[1])
-                board.remove_piece(current_pos[0] + (final_pos[0] - current_pos[0]) // 2, current_pos[1] + (final_pos[1] - current_pos[1]) // 2)
+            depth = depth or self.depth
+            best_move, score = self._alpha_beta(depth - 1, board, 'max', alpha=-float('inf'), beta=float('inf'), root=True)
+            self._depth_reached = depth
+            pv = list(self._pv_table[0])
+        return Analysis(best_move, score, pv, self._count_nodes + self._count_quiescence_nodes, self._depth_reached)
 
-            if board.legal_moves(final_pos[0], final_pos[1], self.game.hop) == []:
-                return
-            else:
-                current_pos = final_pos
-                final_pos = board.legal_moves(current_pos[0], current_pos[1], True)
-                if final_pos != []:
-                    # print("HOP in Action", current_pos, final_pos)
-                    self._action_on_board(board, current_pos, final_pos[0],hop=True)
-
-    def _generate_move(self, board):
-        for i in range(8):
-            for j in range(8):
-                if(board.legal_moves(i, j, self.game.hop) != [] and board.location(i, j).occupant != None and board.location(i, j).occupant.color == self.game.turn):
-                    yield (i, j, board.legal_moves(i, j, self.game.hop))
-
-    def _generate_all_possible_moves(self, board):
-        possible_moves = []
-        for i in range(8):
-            for j in range(8):
-                if(board.legal_moves(i, j, self.game.hop) != [] and board.location(i, j).occupant != None and board.location(i, j).occupant.color == self.game.turn):
-                    possible_moves.append(
-                        (i, j, board.legal_moves(i, j, self.game.hop)))
-        return possible_moves
+    def _start_stats(self):
+        # Wraps the evals and move generation to time and count them. Without stats nothing is wrapped.
+        stats = self._stats = SearchStats(self.color, self.method)
+
+        def timed_eval(evaluate):
+            def timed(board):
+                start = perf_counter()
+                value = evaluate(board)
+                stats.eval_seconds += perf_counter() - start
+                stats.leaf_evals += 1
+                return value
+            return timed
+
+        def timed_movegen(generate):
+            def timed(board):
+                start = perf_counter()
+                moves = generate(board)
+                stats.movegen_seconds += perf_counter() - start
+                stats.movegen_calls += 1
+                return moves
+            return timed
+
+        def timed_batch_eval(states):
+            start = perf_counter()
+            values = Bot._batch_eval(self, states)
+            stats.eval_seconds += perf_counter() - start
+            stats.leaf_evals += len(states)
+            return values
+
+        self._unwrapped_eval = self._current_eval
+        self._current_eval = timed_eval(self._current_eval)
+        self._generate_moves = timed_movegen(self._generate_moves)
+        self._generate_jumps = timed_movegen(self._generate_jumps)
+        self._check_for_endgame = timed_movegen(self._check_for_endgame)
+        self._batch_eval = timed_batch_eval
+
+    def _stop_stats(self):
+        # Undoes _start_stats() and returns the stats with the step's counters added in.
+        stats = self._stats
+        self._stats = None
+        self._current_eval = self._unwrapped_eval
+        del self._generate_moves, self._generate_jumps, self._check_for_endgame, self._batch_eval
+        stats.depth = self._depth_reached
+        stats.nodes = self._count_nodes
+        stats.quiescence_nodes += self._count_quiescence_nodes
+        stats.tt_probes += self._count_tt_probes
+        stats.tt_hits += self._count_tt_hits
+        stats.tt_cutoffs += self._count_tt_cutoffs
+        stats.tb_hits += self._count_tb_hits
+        stats.from_book = self._from_book
+        stats.ponder_hit = self._ponder_hit
+        return stats
+
+    def _action(self, move, board):
+        # Plays the chosen move on the game board and hands the turn over.
+        if move is None:
+            return
+        self.last_move = move
+        board.make_move(move)
+        self.game.end_turn()
+
+    def _predict_reply(self, board):
+        # The move expected from the opponent, now to move on board: the second move of the principal
+        # variation, else the transposition table's best move. None when there is no guess.
+        moves = board.generate_moves(self.game.turn, self.game.forced_capture)
+        if len(self._pv) > 1 and self._pv[1][0] == board.zobrist_key(self.game.turn) and self._pv[1][1] in moves:
+            return self._pv[1][1]
+        if self._tt is not None:
+            entry = self._tt.probe(board.zobrist_key(self.game.turn))
+            if entry is not None:
+                for move in moves:
+                    if self._move_key(move) == entry[3]:
+                        return move
+        return None
+
+    def _start_pondering(self, board):
+        if self.game.endit:
+            return
+        reply = self._predict_reply(board)
+        if reply is None:
+            return
+        ponder_board = Board()
+        ponder_board.set_position(*board.state()[:4])
+        ponder_board.make_move(reply)
+        config = dict(self._config, tt_size_mb=0, tablebase=None, book=None)
+        ponder = Bot(GameState(ponder_board, self.color, self.game.forced_capture), self.color,
+                     time_limit_ms=self.time_limit_ms, **config)
+        ponder._tt = self._tt
+        ponder._tablebase = self._tablebase
+        ponder._history = self._history
+        if ponder._end_eval is not None and (self._end_eval_time or ponder._all_kings(ponder_board)):
+            ponder._end_eval_time = True
+            ponder._current_eval = ponder._end_eval
+        if self._tt is not None:
+            self._tt.new_search()
+        self._ponder_bot = ponder
+        self._ponder_position = ponder_board.state()[:4]
+        ponder._ponder_start = perf_counter()
+        self._ponder_thread = threading.Thread(target=ponder._ponder_search, daemon=True)
+        self._ponder_thread.start()
+
+    def _ponder_search(self):
+        # Runs in the ponder thread, on the ponder bot: the search the next step would do, 1, 2, 3, ...
+        # plies deep for a time-limited bot. It runs until it is done or _ponder_until passes and keeps
+        # the move of the last search that finished.
+        board = self.game.board
+        depths = range(1, MAX_DEPTH + 1) if self.time_limit_ms is not None else [self.depth]
+        try:
+            for depth in depths:
+                with self._ponder_lock:
+                    self._deadline = self._ponder_until
+                random_move, _ = self._alpha_beta(depth - 1, board, 'max', alpha=-float('inf'), beta=float('inf'), root=True)
+                self._ponder_move = random_move
+                self._depth_reached = depth
+                self._pv = self._principal_variation(board)
+                if random_move is None:
+                    break
+        except SearchTimeout:
+            pass
+
+    def _stop_pondering(self, board=None):
+        # Ends the ponder search. When it searched the position on board, a fixed-depth one is waited for
+        # and a time-limited one gets what is left of the time limit counted from when it started, so it
+        # stops at once if it has pondered that long already; the ponder bot is returned if it found a
+        # move. Otherwise it is stopped at once and None is returned.
+        if self._ponder_thread is None:
+            return None
+        ponder = self._ponder_bot
+        hit = board is not None and self.game.turn == self.color and board.state()[:4] == self._ponder_position
+        with ponder._ponder_lock:
+            if not hit:
+                ponder._ponder_until = 0
+            elif self.time_limit_ms is not None:
+                ponder._ponder_until = ponder._ponder_start + self.time_limit_ms / 1000
+            ponder._deadline = ponder._ponder_until
+        self._ponder_thread.join()
+        self._ponder_thread = None
+        self._ponder_bot = None
+        return ponder if hit and ponder._ponder_move is not None else None
+
+    def _book_move(self, board):
+        # a move from the opening book, or None to search
+        if self._book is None or self._book_moves >= self.book_depth:
+            return None
+        self._book_moves += 1
+        entries = self._book.lookup(board.zobrist_key(self.game.turn))
+        if not entries:
+            return None
+        # two jump chains with the same key: play the first, as the search would order them
+        moves = {}
+        for move in reversed(self._generate_moves(board)):
+            moves[self._move_key(move)] = move
+        choices = [(moves[entry.move], entry.games) for entry in entries if entry.move in moves]
+        if not choices:
+            return None
+        book_moves, weights = zip(*choices)
+        return random.choices(book_moves, weights)[0]
+
+    def _generate_moves(self, board):
+        return board.generate_moves(self.game.turn, self.game.forced_capture)
+
+    def _generate_jumps(self, board):
+        return board.generate_jumps(self.game.turn)
+
+    def _ordered_moves(self, board, ply, hash_move=-1):
+        # Moves at this node. The move the previous iteration's principal variation
+        # played here (if this node is on it) is tried first. With move_ordering on,
+        # moves are sorted jumps first (longest first), then the PV or transposition
+        # table move, then killers, then by history score.
+        moves = self._generate_moves(board)
+        pv_move = None
+        if ply < len(self._pv) and self._pv[ply][0] == board.zobrist_key(self.game.turn):
+            pv_move = self._pv[ply][1]
+        if not self.move_ordering:
+            if pv_move in moves:
+                moves.remove(pv_move)
+                moves.insert(0, pv_move)
+            return moves
+
+        if pv_move is not None:
+            hash_move = self._move_key(pv_move)
+        killers = self._killers[ply]
+        history_offset = 0 if self.game.turn == RED else 1024
+        ordered = []
+        for move in moves:
+            key = self._move_key(move)
+            ordered.append(((len(move.captured), key == hash_move, key in killers, self._history[history_offset + key]), move))
+        ordered.sort(key=lambda item: item[0], reverse=True)
+        return [move for _, move in ordered]
+
+    def _move_key(self, move):
+        # start << 5 | end. Two jump chains between the same squares share a key.
+        return move.start << 5 | move.end
+
+    def _record_cutoff(self, move, depth, ply):
+        # quiet moves that cause a cutoff become killers at this ply and gain history
+        if move.captured:
+            return
+        key = self._move_key(move)
+        killers = self._killers[ply]
+        if key not in killers:
+            killers.insert(0, key)
+            del killers[2:]
+        self._history[(0 if self.game.turn == RED else 1024) + key] += (depth + 1) ** 2
+
+    def _principal_variation(self, board):
+        # Replays the line in self._pv_table[0] to key each of its positions.
+        pv = []
+        undos = []
+        turn = self.game.turn
+        for move in self._pv_table[0]:
+            pv.append((board.zobrist_key(turn), move))
+            undos.append(board.make_move(move))
+            turn = RED if turn == BLUE else BLUE
+        for undo in reversed(undos):
+            board.unmake_move(undo)
+        return pv
 
     def _random_step(self, board):
-        possible_moves = self._generate_all_possible_moves(board)
+        possible_moves = self._generate_moves(board)
         if possible_moves == []:
             self.game.end_turn()
             return
-        random_move = random.choice(possible_moves)
-        rand_choice = random.choice(random_move[2])
-        self._action(random_move, rand_choice, board)
+        self._action(random.choice(possible_moves), board)
         return
 
     def _minmax_step(self, board):
-        random_move, random_choice, _ = self._minmax(
-            self.depth - 1, board, 'max')
-        self._action(random_move, random_choice, board)
+        random_move, _ = self._minmax(self.depth - 1, board, 'max')
+        self._depth_reached = self.depth
+        self._action(random_move, board)
         return
 
     def _alpha_beta_step(self, board):
-        random_move, random_choice, _ = self._alpha_beta(self.depth - 1, board, 'max', alpha=-float('inf'), beta=float('inf'))
-        # print(self.eval_color, self.game.turn, self.game.hop)
-        self._action(random_move, random_choice, board)
-        # print(self.eval_color, self.game.turn, self.game.hop)
+        if self.time_limit_ms is None:
+            random_move, _ = self._alpha_beta(self.depth - 1, board, 'max', alpha=-float('inf'), beta=float('inf'), root=True)
+            self._depth_reached = self.depth
+            self._pv = self._principal_variation(board)
+        else:
+            random_move, _ = self._iterative_deepening(board)
+        self._action(random_move, board)
         return
 
+    def _parallel_alpha_beta_step(self, board):
+        # Root splitting: the first root move is searched here to get a score to beat,
+        # then the other root moves are searched by the worker processes with that score
+        # as alpha. Moves that cannot beat it fail low and return early.
+        state = board.state()
+        moves = self._ordered_moves(board, 0)
+        if len(moves) < 2:
+            self._alpha_beta_step(board)
+            return
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.workers)
+
+        self._depth_reached = self.depth
+        best_move = moves[0]
+        best_value = self._search_child(board, best_move, self.depth - 1, True, -float('inf'), float('inf'), 0)
+        jobs = [(state, self.game.turn, self.game.forced_capture, self._config, self._end_eval_time,
+                 self.depth - 1, move, best_value, self._stats is not None) for move in moves[1:]]
+        for move, (step_value, count_nodes, stats) in zip(moves[1:], self._pool.map(_search_root_move, jobs)):
+            self._count_nodes += count_nodes
+            if stats is not None:
+                self._stats.merge(stats)
+            if step_value > best_value or (step_value == best_value and random.random() <= 0.5):
+                best_value = step_value
+                best_move = move
+        self._action(best_move, board)
+
+    def close(self):
+        # stops pondering and the worker processes of a parallel bot and unmaps the tablebase
+        self._stop_pondering()
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+        if self._tablebase is not None:
+            self._tablebase.close()
+            self._tablebase = None
+        if self._book is not None:
+            self._book.close()
+            self._book = None
+
+    def _iterative_deepening(self, board):
+        # Searches 1, 2, 3, ... plies until the time budget runs out and returns the
+        # move and score of the last iteration that finished. The first iteration always finishes.
+        deadline = perf_counter() + self.time_limit_ms / 1000
+        state = board.state()
+        color, adversary_color, turn = self.color, self.adversary_color, self.game.turn
+        best_move = None
+        score = None
+        for depth in range(1, MAX_DEPTH + 1):
+            self._deadline = deadline if depth > 1 else None
+            try:
+                if self.method == 'pvs' and score is not None and not math.isinf(score):
+                    random_move, score = self._aspiration_search(depth, board, score)
+                else:
+                    random_move, score = self._alpha_beta(depth - 1, board, 'max', alpha=-float('inf'), beta=float('inf'), root=True)
+            except SearchTimeout:
+                board.unmake_move(state)
+                self.color, self.adversary_color, self.game.turn = color, adversary_color, turn
+                break
+            finally:
+                self._deadline = None
+            best_move = random_move
+            self._depth_reached = depth
+            self._pv = self._principal_variation(board)
+            if random_move is None or perf_counter() >= deadline:
+                break
+        return best_move, score
+
+    def _aspiration_search(self, depth, board, score):
+        # Searches depth plies in a window of aspiration_window around score, the last iteration's score.
+        # A result outside the window is only a bound, so that side of the window is opened and the
+        # search repeated.
+        alpha, beta = score - self.aspiration_window, score + self.aspiration_window
+        while True:
+            random_move, value = self._alpha_beta(depth - 1, board, 'max', alpha, beta, root=True)
+            if value < alpha:
+                alpha = -float('inf')
+            elif value > beta:
+                beta = float('inf')
+            else:
+                return random_move, value
+            if self._stats is not None:
+                self._stats.researches += 1
+
     def _minmax(self, depth, board, fn):
-        if depth == 0:
-            if fn == 'max':
-                max_value = -float("inf")
-                best_pos = None
-                best_action = None
-                for pos in self._generate_move(board):
-                    for action in pos[2]:
-                        board_clone = deepcopy(board)
-                        self.color, self.adversary_color = self.adversary_color, self.color
-                        self.game.turn = self.color
-                        self._action_on_board(board_clone, pos, action)
-                        self._count_nodes += 1
-                        step_value = self._current_eval(board_clone)
-                        self.color, self.adversary_color = self.adversary_color, self.color
-                        self.game.turn = self.color
-
-                        if step_value > max_value:
-                            max_value = step_value
-                            best_pos = pos
-                            best_action = (action[0], action[1])
-                        elif step_value == max_value and random.random() <= 0.5:
-                            max_value = step_value
-                            best_pos = (pos[0], pos[1])
-                            best_action = (action[0], action[1])
-                        if(step_value == -float("inf") and best_pos is  None):
-                            best_pos = (pos[0], pos[1])
-                            best_action = (action[0], action[1])
-                return best_pos, best_action, max_value
+        maximizing = fn == 'max'
+        best_value = -float("inf") if maximizing else float("inf")
+        best_move = None
+        moves = self._generate_moves(board)
+        leaf_values = self._batch_leaf_values(board, moves) if depth == 0 and self._batching() else None
+        for index, move in enumerate(moves):
+            if self._deadline is not None and self._count_nodes & 255 == 0 and perf_counter() > self._deadline:
+                raise SearchTimeout()
+            self.color, self.adversary_color = self.adversary_color, self.color
+            self.game.turn = self.color
+            undo = board.make_move(move)
+            self._count_nodes += 1
+            if self._stats is not None:
+                self._stats.count_node(self.depth - depth)
+            if leaf_values is not None:
+                step_value = leaf_values[index]
+            elif self._in_tablebase(board):
+                step_value = self._tablebase_value(board, self.game.turn)
+            elif depth == 0 and self.quiescence:
+                step_value = self._quiescence(board, 'min' if maximizing else 'max', -float('inf'), float('inf'), 0)
+            elif depth == 0:
+                step_value = self._current_eval(board)
+            elif self._check_for_endgame(board):
+                step_value = float("inf") if maximizing else -float("inf")
             else:
-                min_value = float("inf")
-                best_pos = None
-                best_action = None
-                for pos in self._generate_move(board):
-                    for action in pos[2]:
-                        board_clone = deepcopy(board)
-                        self.color, self.adversary_color = self.adversary_color, self.color
-                        self.game.turn = self.color
-                        self._count_nodes += 1
-                        self._action_on_board(board_clone, pos, action)
-                        step_value = self._current_eval(board_clone)
-                        self.color, self.adversary_color = self.adversary_color, self.color
-                        self.game.turn = self.color
-                        if step_value < min_value:
-                            min_value = step_value
-                            best_pos = pos
-                            best_action = action
-                        elif step_value == min_value and random.random() <= 0.5:
-                            min_value = step_value
-                            best_pos = pos
-                            best_action = action
-                        if(step_value == float("inf") and best_pos is  None):
-                            best_pos = (pos[0], pos[1])
-                            best_action = (action[0], action[1])
-                return best_pos, best_action, min_value
+                _, step_value = self._minmax(depth - 1, board, 'min' if maximizing else 'max')
+            board.unmake_move(undo)
+            self.color, self.adversary_color = self.adversary_color, self.color
+            self.game.turn = self.color
+            if (step_value > best_value) if maximizing else (step_value < best_value):
+                best_value = step_value
+                best_move = move
+            elif step_value == best_value and (best_move is None or random.random() <= 0.5):
+                best_move = move
+        return best_move, best_value
+
+    def _alpha_beta(self, depth, board, fn, alpha, beta, root=False, ply=0):
+        if self._tt is None:
+            return self._alpha_beta_search(depth, board, fn, alpha, beta, ply)
+
+        key = board.zobrist_key(self.game.turn)
+        self._count_tt_probes += 1
+        entry = self._tt.probe(key)
+        hash_move = -1
+        if entry is not None:
+            self._count_tt_hits += 1
+            tt_depth, bound, score, hash_move = entry
+            # the root still has to search to pick its move
+            if not root and tt_depth >= depth:
+                if bound == EXACT or (bound == LOWER and score > beta) or (bound == UPPER and score < alpha):
+                    self._count_tt_cutoffs += 1
+                    return None, score
+
+        best_move, value = self._alpha_beta_search(depth, board, fn, alpha, beta, ply, hash_move)
+        if value <= alpha:
+            bound = UPPER
+        elif value >= beta:
+            bound = LOWER
         else:
-            if fn == 'max':
-                max_value = -float("inf")
-                best_pos = None
-                best_action = None
-                for pos in self._generate_move(board):
-                    for action in pos[2]:
-                        board_clone = deepcopy(board)
-                        self.color, self.adversary_color = self.adversary_color, self.color
-                        self.game.turn = self.color
-                        self._action_on_board(board_clone, pos, action)
-                        self._count_nodes += 1
-                        if self._check_for_endgame(board_clone):
-                            step_value = float("inf")
-                        else:
-                            _, _, step_value = self._minmax(depth - 1, board_clone, 'min')
-                        self.color, self.adversary_color = self.adversary_color, self.color
-                        self.game.turn = self.color
-                        # print('POS', (pos[0], pos[1]), 'ACK', action, 'MAX', depth, step_value)
-                        if(step_value is None):
-                            continue
-                        # print('max->', depth, step_value, (pos[0], pos[1]), action, self.color)
-                        if step_value > max_value:
-                            max_value = step_value
-                            best_pos = pos
-                            best_action = action
-                        elif step_value == max_value and random.random() <= 0.5:
-                            max_value = step_value
-                            best_pos = pos
-                            best_action = action
-                        if(step_value == -float("inf") and best_pos is  None):
-                            best_pos = (pos[0], pos[1])
-                            best_action = (action[0], action[1])
-                return best_pos, best_action, max_value
+            bound = EXACT
+        self._tt.store(key, depth, bound, value, -1 if best_move is None else self._move_key(best_move))
+        return best_move, value
+
+    def _alpha_beta_search(self, depth, board, fn, alpha, beta, ply, hash_move=-1):
+        maximizing = fn == 'max'
+        best_value = -float("inf") if maximizing else float("inf")
+        best_move = None
+        self._pv_table[ply] = []
+        moves = self._ordered_moves(board, ply, hash_move)
+        leaf_values = self._batch_leaf_values(board, moves) if depth == 0 and self._batching() else None
+        for index, move in enumerate(moves):
+            if self._deadline is not None and self._count_nodes & 255 == 0 and perf_counter() > self._deadline:
+                raise SearchTimeout()
+            self._pv_table[ply + 1] = []
+            if leaf_values is not None:
+                self._count_nodes += 1
+                if self._stats is not None:
+                    self._stats.count_node(ply + 1)
+                step_value = leaf_values[index]
+            elif self.method == 'pvs' and index > 0 and depth > 0:
+                step_value = self._scout_child(board, move, depth, maximizing, alpha, beta, ply)
             else:
-                min_value = float("inf")
-                best_pos = None
-                best_action = None
-                for pos in self._generate_move(board):
-                    for action in pos[2]:
-                        board_clone = deepcopy(board)
-                        # print('POS', (pos[0], pos[1]), 'ACK', action, 'MIN', depth)
-                        self.color, self.adversary_color = self.adversary_color, self.color
-                        self.game.turn = self.color
-                        self._count_nodes += 1
-                        self._action_on_board(board_clone, pos, action)
-                        if self._check_for_endgame(board_clone):
-                            step_value = -float("inf")
-                        else:
-                            _, _, step_value = self._minmax( depth - 1, board_clone, 'max')
-                        self.color, self.adversary_color = self.adversary_color, self.color
-                        self.game.turn = self.color
-                        if(step_value is None):
-                            continue
-                        if step_value < min_value:
-                            min_value = step_value
-                            best_pos = (pos[0], pos[1])
-                            best_action = (action[0], action[1])
-                        elif step_value == min_value and random.random() <= 0.5:
-                            min_value = step_value
-                            best_pos = pos
-                            best_action = action
-                        if(step_value == float("inf") and best_pos is  None):
-                            best_pos = (pos[0], pos[1])
-                            best_action = (action[0], action[1])
-                return best_pos, best_action, min_value
-
-    def _alpha_beta(self, depth, board, fn, alpha, beta):
-        if depth == 0:
-            if fn == 'max':
-                max_value = -float("inf")
-                best_pos = None
-                best_action = None
-                for pos in self._generate_move(board):
-                    for action in pos[2]:
-                        board_clone = deepcopy(board)
-                        self.color, self.adversary_color = self.adversary_color, self.color
-                        self.game.turn = self.color
-                        self._count_nodes += 1
-                        self._action_on_board(board_clone, pos, action)
-                        step_value = self._current_eval(board_clone)
-                        self.color, self.adversary_color = self.adversary_color, self.color
-                        self.game.turn = self.color
-                        # print('max->', depth, step_value, (pos[0], pos[1]), action, self.color)
-                        if step_value > max_value:
-                            max_value = step_value
-                            best_pos = pos
-                            best_action = (action[0], action[1])
-                        elif step_value == max_value and random.random() <= 0.5:
-                            max_value = step_value
-                            best_pos = (pos[0], pos[1])
-                            best_action = (action[0], action[1])
-                        if(step_value == -float("inf") and best_pos is  None):
-                            best_pos = (pos[0], pos[1])
-                            best_action = (action[0], action[1])
-                        alpha = max(alpha, max_value)
-                        if beta < alpha:
-                            # print('beta cutoff')
-                            break
-                    if beta < alpha:
-                        # print('beta cutoff')
-                        break
-                return best_pos, best_action, max_value
+                step_value = self._search_child(board, move, depth, maximizing, alpha, beta, ply)
+            # print(fn, depth, step_value, move, self.color)
+            # equal scores are broken at random; a lost (for min: won) position still returns some move
+            if (step_value > best_value) if maximizing else (step_value < best_value):
+                best_value = step_value
+                best_move = move
+                self._pv_table[ply] = [move] + self._pv_table[ply + 1]
+            elif step_value == best_value and (best_move is None or random.random() <= 0.5):
+                best_move = move
+                self._pv_table[ply] = [move] + self._pv_table[ply + 1]
+            if maximizing:
+                alpha = max(alpha, best_value)
             else:
-                min_value = float("inf")
-                best_pos = None
-                best_action = None
-                for pos in self._generate_move(board):
-                    for action in pos[2]:
-                        board_clone = deepcopy(board)
-                        self.color, self.adversary_color = self.adversary_color, self.color
-                        self.game.turn = self.color
-                        self._action_on_board(board_clone, pos, action)
-                        self._count_nodes += 1
-                        step_value = self._current_eval(board_clone)
-                        self.color, self.adversary_color = self.adversary_color, self.color
-                        self.game.turn = self.color
-                        # print('min->', depth, step_value, (pos[0], pos[1]), action, self.color)
-                        if step_value < min_value:
-                            min_value = step_value
-                            best_pos = pos
-                            best_action = action
-                        elif step_value == min_value and random.random() <= 0.5:
-                            min_value = step_value
-                            best_pos = pos
-                            best_action = action
-                        if(step_value == float("inf") and best_pos is  None):
-                            best_pos = (pos[0], pos[1])
-                            best_action = (action[0], action[1])
-                        beta = min(beta, min_value)
-                        if beta < alpha:
-                            # print('alpha cutoff')
-                            break
-                    if beta < alpha:
-                        # print('alpha cutoff')
-                        break
-                return best_pos, best_action, min_value
+                beta = min(beta, best_value)
+            if beta < alpha:
+                if self.move_ordering:
+                    self._record_cutoff(move, depth, ply)
+                if self._stats is not None:
+                    self._stats.count_cutoff(maximizing, index)
+                break
+        return best_move, best_value
+
+    def _search_child(self, board, move, depth, maximizing, alpha, beta, ply):
+        # Plays move, scores the position it leads to and takes the move back.
+        self.color, self.adversary_color = self.adversary_color, self.color
+        self.game.turn = self.color
+        undo = board.make_move(move)
+        self._count_nodes += 1
+        if self._stats is not None:
+            self._stats.count_node(ply + 1)
+        if self._in_tablebase(board):
+            step_value = self._tablebase_value(board, self.game.turn)
+        elif depth == 0 and self.quiescence:
+            step_value = self._quiescence(board, 'min' if maximizing else 'max', alpha, beta, 0)
+        elif depth == 0:
+            step_value = self._current_eval(board)
+        elif self._check_for_endgame(board):
+            step_value = float("inf") if maximizing else -float("inf")
+        else:
+            _, step_value = self._alpha_beta(depth - 1, board, 'min' if maximizing else 'max', alpha, beta, ply=ply + 1)
+        board.unmake_move(undo)
+        self.color, self.adversary_color = self.adversary_color, self.color
+        self.game.turn = self.color
+        return step_value
+
+    def _scout_child(self, board, move, depth, maximizing, alpha, beta, ply):
+        # A null window search at the score to beat tells whether move beats it, ties it or falls short,
+        # and only a move that beats it is searched again for its exact score. A tie is exact already.
+        # Past the other bound the result does not matter, the node is cut off either way.
+        bound = alpha if maximizing else beta
+        step_value = self._search_child(board, move, depth, maximizing, bound, bound, ply)
+        if (bound < step_value <= beta) if maximizing else (alpha <= step_value < bound):
+            if self._stats is not None:
+                self._stats.researches += 1
+            step_value = self._search_child(board, move, depth, maximizing, alpha, beta, ply)
+        return step_value
+
+    def _batching(self):
+        # the end evals are not per-square sums, so they are never batched
+        return self._leaf_weights is not None and not self._end_eval_time and not self.quiescence
+
+    def _quiescence(self, board, fn, alpha, beta, extension):
+        # Value of a depth-0 position after the jumps available in it have played out. The side to move
+        # may also stop jumping (stand pat) unless captures are forced.
+        maximizing = fn == 'max'
+        stand_pat = self._current_eval(board)
+        if extension >= self.max_quiescence:
+            return stand_pat
+        jumps = self._generate_jumps(board)
+        if not jumps:
+            return stand_pat
+        if self.game.forced_capture:
+            best_value = -float("inf") if maximizing else float("inf")
         else:
-            if fn == 'max':
-                max_value = -float("inf")
-                best_pos = None
-                best_action = None
-                for pos in self._generate_move(board):
-                    for action in pos[2]:
-                        board_clone = deepcopy(board)
-                        self.color, self.adversary_color = self.adversary_color, self.color
-                        self.game.turn = self.color
-                        self._action_on_board(board_clone, pos, action)
-                        self._count_nodes += 1
-                        if self._check_for_endgame(board_clone):
-                            step_value = float("inf")
-                        else:
-                            _, _, step_value = self._alpha_beta(depth - 1, board_clone, 'min', alpha, beta)
-                        self.color, self.adversary_color = self.adversary_color, self.color
-                        self.game.turn = self.color
-                        # print('POS', (pos[0], pos[1]), 'ACK', action, 'MAX', depth, step_value)
-                        if(step_value is None):
-                            continue
-                        # print('max->', depth, step_value, (pos[0], pos[1]), action, self.color)
-                        if step_value > max_value:
-                            max_value = step_value
-                            best_pos = pos
-                            best_action = action
-                        elif step_value == max_value and random.random() <= 0.5:
-                            max_value = step_value
-                            best_pos = pos
-                            best_action = action
-                        if(step_value == -float("inf") and best_pos is  None):
-                            best_pos = (pos[0], pos[1])
-                            best_action = (action[0], action[1])
-                        alpha = max(alpha, max_value)
-                        if beta <= alpha:
-                            # print('beta cutoff')
-                            break
-                    if beta < alpha:
-                        # print('alpha cu3toff')
-                        break
-                return best_pos, best_action, max_value
+            best_value = stand_pat
+            if maximizing:
+                alpha = max(alpha, best_value)
             else:
-                min_value = float("inf")
-                best_pos = None
-                best_action = None
-                for pos in self._generate_move(board):
-                    for action in pos[2]:
-                        board_clone = deepcopy(board)
-                        # print('POS', (pos[0], pos[1]), 'ACK', action, 'MIN', depth)
-                        self.color, self.adversary_color = self.adversary_color, self.color
-                        self.game.turn = self.color
-                        self._count_nodes += 1
-                        self._action_on_board(board_clone, pos, action)
-                        if self._check_for_endgame(board_clone):
-                            step_value = -float("inf")
-                        else:
-                            _, _, step_value = self._alpha_beta( depth - 1, board_clone, 'max', alpha, beta)
-                        self.color, self.adversary_color = self.adversary_color, self.color
-                        self.game.turn = self.color
-                        if(step_value is None):
-                            continue
-                        if step_value < min_value:
-                            min_value = step_value
-                            best_pos = (pos[0], pos[1])
-                            best_action = (action[0], action[1])
-                        elif step_value == min_value and random.random() <= 0.5:
-                            min_value = step_value
-                            best_pos = pos
-                            best_action = action
-                        # print('min->', depth, step_value, (pos[0], pos[1]), action, self.color)
-                        if(step_value == float("inf") and best_pos is  None):
-                            best_pos = (pos[0], pos[1])
-                            best_action = (action[0], action[1])
-                        beta = min(beta, min_value)
-                        if beta < alpha:
-                            # print('alpha cutoff')
-                            break
-                    if beta < alpha:
-                        # print('alpha cutoff')
-                        break
-                return best_pos, best_action, min_value
+                beta = min(beta, best_value)
+            if beta < alpha:
+                return best_value
+        for move in jumps:
+            self.color, self.adversary_color = self.adversary_color, self.color
+            self.game.turn = self.color
+            undo = board.make_move(move)
+            self._count_quiescence_nodes += 1
+            if self._in_tablebase(board):
+                step_value = self._tablebase_value(board, self.game.turn)
+            elif self._check_for_endgame(board):
+                step_value = float("inf") if maximizing else -float("inf")
+            else:
+                step_value = self._quiescence(board, 'min' if maximizing else 'max', alpha, beta, extension + 1)
+            board.unmake_move(undo)
+            self.color, self.adversary_color = self.adversary_color, self.color
+            self.game.turn = self.color
+            if maximizing:
+                best_value = max(best_value, step_value)
+                alpha = max(alpha, best_value)
+            else:
+                best_value = min(best_value, step_value)
+                beta = min(beta, best_value)
+            if beta < alpha:
+                break
+        return best_value
+
+    def _batch_leaf_values(self, board, moves):
+        # Scores the positions after each of moves in one NumPy call. Same values as self._mid_eval.
+        turn = RED if self.game.turn == BLUE else BLUE
+        states = []
+        tb_values = {}
+        for index, move in enumerate(moves):
+            undo = board.make_move(move)
+            states.append(board.state()[:4])
+            if self._in_tablebase(board):
+                tb_values[index] = self._tablebase_value(board, turn)
+            board.unmake_move(undo)
+        values = self._batch_eval(states)
+        for index, tb_value in tb_values.items():
+            values[index] = tb_value
+        return values
+
+    def _in_tablebase(self, board):
+        return self._tablebase is not None and self._tablebase.covers(board)
+
+    def _tablebase_value(self, board, turn):
+        # exact score of a position _in_tablebase() with turn to move
+        self._count_tb_hits += 1
+        result, plies = self._tablebase.probe(board, turn)
+        if result == DRAW:
+            return 0
+        score = TB_WIN - plies
+        return score if (result == WIN) == (turn == self.eval_color) else -score
+
+    def _batch_eval(self, states):
+        # states: (red men, red kings, blue men, blue kings) masks of each position
+        if not states:  # a node without moves
+            return []
+        masks = np.array(states, dtype='<u4').view(np.uint8)
+        squares = np.unpackbits(masks, axis=1, bitorder='little')
+        scores = squares @ self._leaf_weights
+        if self._pov_eval:
+            scores = scores / squares.sum(axis=1, dtype=np.int64)
+        return scores.tolist()
+
+    def _eval_weights(self, mid_eval):
+        # Per-square weights of mid_eval from eval_color's point of view, in the square order of _batch_eval.
+        sign = 1 if self.eval_color == RED else -1
+        red_men, red_kings, blue_men, blue_kings = (np.zeros(32, dtype=np.int64) for _ in range(4))
+        for bit, (x, y) in enumerate(SQUARES):
+            if mid_eval == 'piece2val':
+                red_men[bit], red_kings[bit] = sign, 2 * sign
+                blue_men[bit], blue_kings[bit] = -sign, -2 * sign
+            elif mid_eval == 'piece_and_row':
+                # a king scores for its row like a man and 2 more for being a king
+                red_men[bit], red_kings[bit] = sign * (5 + y), sign * (7 + y)
+                blue_men[bit], blue_kings[bit] = -sign * (13 - y), -sign * (15 - y)
+            elif mid_eval in ('piece_and_board', 'piece_and_board_pov'):
+                if sign == 1:
+                    red_men[bit], blue_men[bit] = (5, -7) if y < 4 else (7, -5)
+                else:
+                    red_men[bit], blue_men[bit] = -5, 7
+                red_kings[bit], blue_kings[bit] = 10 * sign, -10 * sign
+            else:
+                raise ValueError('no batched version of mid eval %r' % mid_eval)
+        return np.concatenate((red_men, red_kings, blue_men, blue_kings))
 
     def _piece2val(self, board):
-        score = 0
-        for i in range(8):
-            for j in range(8):
-                occupant = board.location(i, j).occupant
-                if(occupant is not None):
-                    if(occupant.color == self.eval_color):
-                        score += occupant.value
-                    else:
-                        score -= occupant.value
+        totals = board.totals
+        player = TOTALS[self.eval_color]
+        adversary = TOTALS[RED if self.eval_color == BLUE else BLUE]
+        score = totals[player + MEN] + 2 * totals[player + KINGS]
+        score -= totals[adversary + MEN] + 2 * totals[adversary + KINGS]
         return score
 
     def _piece_and_row2val(self, board):
-        score = 0
+        totals = board.totals
+        player = TOTALS[self.eval_color]
+        adversary = TOTALS[RED if self.eval_color == BLUE else BLUE]
+        player_pieces = totals[player + MEN] + totals[player + KINGS]
+        adversary_pieces = totals[adversary + MEN] + totals[adversary + KINGS]
+        score = 2 * totals[player + KINGS] - 2 * totals[adversary + KINGS]
         if(self.eval_color == RED):
-            for i in range(8):
-                for j in range(8):
-                    occupant = board.location(i, j).occupant
-                    if(occupant is not None):
-                        if occupant.color == self.eval_color:
-                            score += 5 + j + 2 * (occupant.king)
-                        else:
-                            score -= 5 + (8 - j) + 2 * (occupant.king)
+            # 5 + j for each of our pieces, 5 + (8 - j) for each of theirs
+            score += 5 * player_pieces + totals[player + ROWS]
+            score -= 13 * adversary_pieces - totals[adversary + ROWS]
         else:
-            for i in range(8):
-                for j in range(8):
-                    occupant = board.location(i, j).occupant
-                    if(occupant is not None):
-                        if occupant.color == self.eval_color:
-                            score += 5 + (8 - j) + 2 * (occupant.king)
-                        else:
-                            score -= 5 + j + 2 * (occupant.king)
+            score += 13 * player_pieces - totals[player + ROWS]
+            score -= 5 * adversary_pieces + totals[adversary + ROWS]
         return score
 
     def _piece_and_board2val(self, board):
-        score = 0
+        totals = board.totals
+        player = TOTALS[self.eval_color]
+        adversary = TOTALS[RED if self.eval_color == BLUE else BLUE]
+        score = 10 * totals[player + KINGS] - 10 * totals[adversary + KINGS]
         if(self.eval_color == RED):
-            for i in range(8):
-                for j in range(8):
-                    occupant = board.location(i, j).occupant
-                    if(occupant is not None):
-                        if occupant.color == self.eval_color and occupant.king:
-                            score += 10
-                        elif occupant.color != self.eval_color and occupant.king:
-                            score -= 10
-                        elif occupant.color == self.eval_color and j < 4:
-                            score += 5
-                        elif occupant.color != self.eval_color and j < 4:
-                            score -= 7
-                        elif occupant.color == self.eval_color and j >= 4:
-                            score += 7
-                        elif occupant.color != self.eval_color and j >= 4:
-                            score -= 5
+            player_top = totals[player + TOP_MEN]
+            adversary_top = totals[adversary + TOP_MEN]
+            score += 5 * player_top + 7 * (totals[player + MEN] - player_top)
+            score -= 7 * adversary_top + 5 * (totals[adversary + MEN] - adversary_top)
         else:
-            for i in range(8):
-                for j in range(8):
-                    occupant = board.location(i, j).occupant
-                    if(occupant is not None):
-                        if occupant.color == self.eval_color and occupant.king:
-                            score += 10
-                        elif occupant.color != self.eval_color and occupant.king:
-                            score -= 10
-                        elif occupant.color == self.eval_color and j < 4:
-                            score += 7
-                        elif occupant.color != self.eval_color and j < 4:
-                            score -= 5
-                        elif occupant.color == self.eval_color and j >= 4:
-                            score += 7
-                        elif occupant.color != self.eval_color and j >= 4:
-                            score -= 5
+            score += 7 * totals[player + MEN]
+            score -= 5 * totals[adversary + MEN]
         return score
 
     def _piece_and_board_pov2val(self, board):
-        score = 0
-        num_pieces = 0
-        if(self.eval_color == RED):
-            for i in range(8):
-                for j in range(8):
-                    occupant = board.location(i, j).occupant
-                    if(occupant is not None):
-                        num_pieces += 1
-                        if occupant.color == self.eval_color and occupant.king:
-                            score += 10
-                        elif occupant.color != self.eval_color and occupant.king:
-                            score -= 10
-                        elif occupant.color == self.eval_color and j < 4:
-                            score += 5
-                        elif occupant.color != self.eval_color and j < 4:
-                            score -= 7
-                        elif occupant.color == self.eval_color and j >= 4:
-                            score += 7
-                        elif occupant.color != self.eval_color and j >= 4:
-                            score -= 5
-        else:
-            for i in range(8):
-                for j in range(8):
-                    occupant = board.location(i, j).occupant
-                    if(occupant is not None):
-                        num_pieces += 1
-                        if occupant.color == self.eval_color and occupant.king:
-                            score += 10
-                        elif occupant.color != self.eval_color and occupant.king:
-                            score -= 10
-                        elif occupant.color == self.eval_color and j < 4:
-                            score += 7
-                        elif occupant.color != self.eval_color and j < 4:
-                            score -= 5
-                        elif occupant.color == self.eval_color and j >= 4:
-                            score += 7
-                        elif occupant.color != self.eval_color and j >= 4:
-                            score -= 5
-        return score / num_pieces
+        totals = board.totals
+        red, blue = TOTALS[RED], TOTALS[BLUE]
+        pieces = totals[red + MEN] + totals[red + KINGS] + totals[blue + MEN] + totals[blue + KINGS]
+        return self._piece_and_board2val(board) / pieces
 
     def _all_kings(self, board):
-        for i in range(8):
-            for j in range(8):
-                occupant = board.location(i, j).occupant
-                if(occupant is not None and occupant.king == False):
-                    return False
-        return True
+        return board.red_men | board.blue_men == 0
 
     def _dist(self, x1, y1, x2, y2):
         return math.sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2)
 
     def _pieces_loc(self, board):
-        player_pieces = []
-        adversary_pieces = []
-        for i in range(8):
-            for j in range(8):
-                occupant = board.location(i, j).occupant
-                if(occupant is not None):
-                    if(occupant.color == self.eval_color):
-                        player_pieces.append((i, j))
-                    else:
-                        adversary_pieces.append((i, j))
+        adversary_color = RED if self.eval_color == BLUE else BLUE
+        player_pieces = [SQUARES[bit] for bit in bits(board.pieces(self.eval_color))]
+        adversary_pieces = [SQUARES[bit] for bit in bits(board.pieces(adversary_color))]
         return player_pieces, adversary_pieces
 
     def _sum_of_dist(self, board):
@@ -622,9 +1033,38 @@ class Bot:
         return farthest_dist
 
     def _check_for_endgame(self, board):
-        for x in range(8):
-            for y in range(8):
-                if board.location(x, y).color == BLACK and board.location(x, y).occupant != None and board.location(x, y).occupant.color == self.game.turn:
-                    if board.legal_moves(x, y) != []:
-                        return False
-        return True
+        return not board.has_legal_moves(self.game.turn)
+
+
+# bots of a worker process, kept between jobs so their transposition tables stay warm
+_worker_bots = {}
+
+
+def _search_root_move(job):
+    # Runs in a worker process of a parallel Bot: scores one root move.
+    state, turn, forced_capture, config, end_eval_time, depth, move, alpha, collect_stats = job
+    key = (turn, tuple(sorted(config.items())), end_eval_time)
+    if key not in _worker_bots:
+        bot = Bot(GameState(Board(), turn, forced_capture), turn, **config)
+        if end_eval_time:
+            bot._end_eval_time = True
+            bot._current_eval = bot._end_eval
+        _worker_bots[key] = bot
+    bot = _worker_bots[key]
+    bot.game.board.set_position(*state[:4])
+    bot.game.turn = turn
+    bot.game.forced_capture = forced_capture
+    bot._count_nodes = 0
+    if bot._tt is not None:
+        bot._tt.new_search()
+    if not collect_stats:
+        step_value = bot._search_child(bot.game.board, move, depth, True, alpha, float('inf'), 0)
+        return step_value, bot._count_nodes, None
+    bot._count_tt_probes = bot._count_tt_hits = bot._count_tt_cutoffs = 0
+    bot._count_tb_hits = bot._count_quiescence_nodes = 0
+    bot._start_stats()
+    try:
+        step_value = bot._search_child(bot.game.board, move, depth, True, alpha, float('inf'), 0)
+    finally:
+        stats = bot._stop_stats()
+    return step_value, bot._count_nodes, stats.as_dict()
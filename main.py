@@ -1,3 +1,4 @@
+import sys
 import checkers
 import gamebot
 from time import sleep
@@ -17,28 +18,58 @@ SOUTHWEST = "southwest"
 SOUTHEAST = "southeast"
 
 
+def play_step(bot, board, stats_file):
+    # --stats FILE appends the SearchStats of every move to FILE as a line of JSON
+    if stats_file is None:
+        count_nodes = bot.step(board, True)
+    else:
+        stats = bot.step(board, return_stats=True)
+        stats_file.write(stats.to_json() + '\n')
+        stats_file.flush()
+        count_nodes = stats.nodes
+    print('Total nodes explored in this step are', count_nodes, '| TT probes',
+          bot._count_tt_probes, 'hits', bot._count_tt_hits, 'cutoffs', bot._count_tt_cutoffs)
+
+
 def main():
+    # python3 main.py --headless plays without a window and without the 60 FPS frame clock
+    headless = '--headless' in sys.argv[1:]
+    # --check-totals recounts the board's running eval totals after every move and take-back
+    checkers.Board.check_totals = '--check-totals' in sys.argv[1:]
+    # --ponder lets the bots search on the other side's time
+    ponder = '--ponder' in sys.argv[1:]
+    # --full-redraw draws the whole window every frame instead of only the squares that changed,
+    # and --frame-stats prints the drawing time per frame after every game to compare the two
+    checkers.Graphics.dirty_rects = '--full-redraw' not in sys.argv[1:]
+    frame_stats = '--frame-stats' in sys.argv[1:]
+    stats_file = None
+    if '--stats' in sys.argv[1:]:
+        stats_file = open(sys.argv[sys.argv.index('--stats') + 1], 'a')
     while True:
-        game = checkers.Game(loop_mode=True)
+        game = checkers.Game(loop_mode=True, headless=headless)
         game.setup()
         bot = gamebot.Bot(game, RED, mid_eval='piece_and_board',
-                          end_eval='sum_of_dist', method='alpha_beta', depth=3)
+                          end_eval='sum_of_dist', method='alpha_beta', depth=3, tt_size_mb=16, move_ordering=True,
+                          ponder=ponder)
         random_bot_blue = gamebot.Bot(
-            game, BLUE, mid_eval='piece_and_board_pov', method='alpha_beta', depth=3, end_eval='sum_of_dist')
+            game, BLUE, mid_eval='piece_and_board_pov', method='alpha_beta', depth=3, end_eval='sum_of_dist', tt_size_mb=16, move_ordering=True,
+            ponder=ponder)
         while True:  # main game loop
             if game.turn == BLUE:
                  # TO start player's turn uncomment the below line and comment a couple  of line below than that
                 # game.player_turn()
-                count_nodes = random_bot_blue.step(game.board, True)
-                print('Total nodes explored in this step are', count_nodes)
+                play_step(random_bot_blue, game.board, stats_file)
                 game.update()
             else:
                 # TO start player's turn uncomment the below line and comment a couple  of line below than that
                 # game.player_turn()
-                count_nodes = bot.step(game.board, True)
-                print('Total nodes explored in this step are', count_nodes)
+                play_step(bot, game.board, stats_file)
                 game.update()
             if game.endit:
+                if frame_stats and game.graphics is not None:
+                    print('Frames drawn', game.graphics.frame_stats())
+                bot.close()
+                random_bot_blue.close()
                 break
 
 
@@ -0,0 +1,406 @@
+"""
+notation.py
+
+Positions and games as text and as packed binary records.
+
+Squares are numbered 1 to 32 the standard way, row by row from the side that moves first: BLUE
+moves first and plays Black on squares 1-12, RED plays White on 21-32. In this numbering:
+
+    FEN   B:W21,22,23,24,25,26,27,28,29,30,31,32:B1,2,3,4,5,6,7,8,9,10,11,12
+          the side to move (B or W), then the white and the black pieces, K before a king;
+          ranges like 1-12 are read too
+    PDN   steps as 11-15, jumps with every landing square, 15x24x31; a game is tags such as
+          [FEN "..."] and [Result "1-0"] followed by numbered moves and the result. As in PGN,
+          1-0 means White (RED) won and 0-1 that Black (BLUE) won.
+
+    python3 notation.py convert games.bin games.pdn
+    python3 notation.py convert games.jsonl games.bin --forced-capture
+    python3 notation.py fen games.bin --game 3
+
+Binary record files (little-endian) are a header b'CKGR', version (H), then the games one after
+another, each: red men, red kings, blue men, blue kings (I) of the start position, side to move,
+forced capture, winner (B: 0 none, 1 red, 2 blue), move count (H), then one H per move:
+start | end << 5 | branch << 10, where branch tells apart jump chains between the same two squares
+(their index among those chains in Board.generate_jumps() order, plus one; 0 for every other move).
+A 60-move game takes 141 bytes. RecordWriter buffers what it writes and RecordReader reads a game
+with two unpacks, so files of millions of games go through quickly; only replaying a game's moves
+into Move objects needs the move generator.
+"""
+
+import argparse
+import json
+import re
+import struct
+import sys
+from collections import namedtuple
+
+from engine import Board, Move, Position, RED, BLUE, RED_START, BLUE_START, SQUARES, JUMPED
+
+# NUMBERS[bit] is the standard number of the square with that bit, BITS[number] the bit of the square
+NUMBERS = [4 * (7 - y) + x // 2 + 1 for x, y in SQUARES]
+BITS = {number: bit for bit, number in enumerate(NUMBERS)}
+
+START = Position(BLUE, RED_START, 0x0, BLUE_START, 0x0)
+
+# PDN result of each winner, and back
+RESULTS = {RED: '1-0', BLUE: '0-1', None: '1/2-1/2'}
+WINNERS = {'1-0': RED, '0-1': BLUE, '1/2-1/2': None, '*': None}
+
+MAGIC = b'CKGR'
+VERSION = 1
+HEADER = struct.Struct('<4sH')
+GAME = struct.Struct('<IIIIBBBH')
+WINNER_CODES = {None: 0, RED: 1, BLUE: 2}
+CODE_WINNERS = {0: None, 1: RED, 2: BLUE}
+
+GameRecord = namedtuple('GameRecord', ['start', 'moves', 'winner', 'forced_capture'])
+
+
+def other(turn):
+    return RED if turn == BLUE else BLUE
+
+
+##FEN##
+
+def to_fen(position):
+    """Returns the FEN of position (an engine.Position)."""
+    fields = ['B' if position.turn == BLUE else 'W']
+    for color, men, kings in (('W', position.red_men, position.red_kings), ('B', position.blue_men, position.blue_kings)):
+        squares = sorted([(NUMBERS[bit], '') for bit in range(32) if men >> bit & 1] +
+                         [(NUMBERS[bit], 'K') for bit in range(32) if kings >> bit & 1])
+        fields.append(color + ','.join(king + str(number) for number, king in squares))
+    return ':'.join(fields)
+
+
+def _fen_squares(text):
+    # [(number, is king), ...] of one side's comma separated squares and ranges
+    squares = []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        king = item[0] == 'K'
+        first, _, last = item.lstrip('K').partition('-')
+        for number in range(int(first), int(last or first) + 1):
+            if number not in BITS:
+                raise ValueError('no square %d' % number)
+            squares.append((number, king))
+    return squares
+
+
+def from_fen(text):
+    """Returns the Position of a FEN such as to_fen() writes. Raises ValueError if text is not one."""
+    fields = text.strip().strip('"').rstrip('.').split(':')
+    if len(fields) != 3 or fields[0].upper() not in ('B', 'W'):
+        raise ValueError('not a FEN: %r' % text)
+    masks = {'W': [0, 0], 'B': [0, 0]}
+    try:
+        for field in fields[1:]:
+            color = field[:1].upper()
+            if color not in masks:
+                raise ValueError('no color in FEN field %r' % field)
+            for number, king in _fen_squares(field[1:]):
+                masks[color][king] |= 1 << BITS[number]
+    except ValueError as error:
+        raise ValueError('not a FEN: %r (%s)' % (text, error))
+    turn = BLUE if fields[0].upper() == 'B' else RED
+    return Position(turn, masks['W'][0], masks['W'][1], masks['B'][0], masks['B'][1])
+
+
+##PDN##
+
+def move_to_pdn(move):
+    """Returns a Move as PDN: 11-15 for a step, 15x24x31 for a jump."""
+    squares = [NUMBERS[move.start]] + [NUMBERS[bit] for bit in move.path]
+    return ('x' if move.captured else '-').join(str(number) for number in squares)
+
+
+def pdn_to_move(text, board, turn, forced_capture=False):
+    """
+    Returns the Move of turn on board that text (PDN) stands for. A jump may be given by its first and
+    last square only when no other chain joins them. Raises ValueError if there is no such move.
+    """
+    try:
+        squares = [BITS[int(number)] for number in re.split('[-x]', text)]
+    except (KeyError, ValueError):
+        raise ValueError('not a PDN move: %r' % text)
+    if len(squares) < 2:
+        raise ValueError('not a PDN move: %r' % text)
+    matches = []
+    for move in board.generate_moves(turn, forced_capture):
+        if move.start != squares[0] or move.end != squares[-1]:
+            continue
+        if len(squares) == 2 or list(move.path) == squares[1:]:
+            matches.append(move)
+    if len(matches) != 1:
+        raise ValueError('%s move %r' % ('illegal' if not matches else 'ambiguous', text))
+    return matches[0]
+
+
+def write_pdn(record, tags=None):
+    """Returns a GameRecord as a PDN game, with tags (a dict) before the FEN and Result tags."""
+    result = RESULTS[record.winner]
+    lines = ['[%s "%s"]' % item for item in (tags or {}).items()]
+    lines.append('[GameType "21"]')
+    if record.start != START:
+        lines.append('[FEN "%s"]' % to_fen(record.start))
+    lines.append('[ForcedCapture "%s"]' % ('yes' if record.forced_capture else 'no'))
+    lines.append('[Result "%s"]' % result)
+    # moves are numbered in pairs from the first, whichever side made it
+    words = []
+    for index, move in enumerate(record.moves):
+        if index % 2 == 0:
+            words.append('%d. %s' % (index // 2 + 1, move_to_pdn(move)))
+        else:
+            words.append(move_to_pdn(move))
+    words.append(result)
+    text = ''
+    for word in words:
+        if len(text) + len(word) >= 80:
+            lines.append(text)
+            text = ''
+        text += (' ' if text else '') + word
+    lines.append(text)
+    return '\n'.join(lines) + '\n'
+
+
+def read_pdn(text, forced_capture=False):
+    """
+    Yields (tags, GameRecord) for every game of a PDN text, checking each move against the move generator.
+    A ForcedCapture tag overrides forced_capture. Comments in braces and variations in brackets are skipped.
+    """
+    text = re.sub(r'\{[^}]*\}', ' ', text)
+    while re.search(r'\([^()]*\)', text):
+        text = re.sub(r'\([^()]*\)', ' ', text)
+    for game in re.split(r'\n\s*\n(?=\s*\[)', text.strip()):
+        if not game.strip():
+            continue
+        tags = dict(re.findall(r'\[(\w+)\s+"([^"]*)"\]', game))
+        body = re.sub(r'\[[^\]]*\]', ' ', game)
+        start = from_fen(tags['FEN']) if 'FEN' in tags else START
+        forced = tags['ForcedCapture'] == 'yes' if 'ForcedCapture' in tags else forced_capture
+        board = Board()
+        board.set_position(*start[1:])
+        turn = start.turn
+        moves = []
+        winner = WINNERS.get(tags.get('Result'))
+        for word in body.split():
+            if word in WINNERS:
+                winner = WINNERS[word]
+                break
+            word = re.sub(r'^\d+\.+', '', word)
+            if not word:
+                continue
+            move = pdn_to_move(word, board, turn, forced)
+            board.make_move(move)
+            moves.append(move)
+            turn = other(turn)
+        yield tags, GameRecord(start, moves, winner, forced)
+
+
+##Binary records##
+
+def encode_move(move, board, turn):
+    """Returns the 16-bit code of move, which turn is about to play on board."""
+    code = move.start | move.end << 5
+    if len(move.path) > 1:
+        chains = [jump for jump in board.generate_jumps(turn)
+                  if jump.start == move.start and jump.end == move.end and len(jump.path) > 1]
+        code |= (chains.index(move) + 1) << 10
+    return code
+
+
+def decode_move(code, board, turn):
+    """Returns the Move of turn on board with the 16-bit code. Raises ValueError if there is none."""
+    start, end, branch = code & 31, code >> 5 & 31, code >> 10
+    if branch == 0:
+        jumped = JUMPED.get((start, end))
+        return Move(start, (end,), () if jumped is None else (jumped,))
+    chains = [jump for jump in board.generate_jumps(turn)
+              if jump.start == start and jump.end == end and len(jump.path) > 1]
+    if branch > len(chains):
+        raise ValueError('no jump chain %d from %d to %d' % (branch, NUMBERS[start], NUMBERS[end]))
+    return chains[branch - 1]
+
+
+def replay(record):
+    """Yields (Position, Move) for every move of a GameRecord, the position being the one it is played from."""
+    board = Board()
+    board.set_position(*record.start[1:])
+    turn = record.start.turn
+    for move in record.moves:
+        if not isinstance(move, Move):
+            move = decode_move(move, board, turn)
+        yield board.position(turn), move
+        board.make_move(move)
+        turn = other(turn)
+
+
+class RecordWriter:
+    """Writes GameRecords to a binary record file through a large write buffer."""
+
+    def __init__(self, path, buffer_size=1 << 20):
+        self._file = open(path, 'wb', buffering=buffer_size)
+        self._file.write(HEADER.pack(MAGIC, VERSION))
+        self._board = Board()
+        self.games = 0
+
+    def write(self, record):
+        """Writes a GameRecord whose moves are Moves (encoded by replaying them) or already move codes."""
+        codes = []
+        if record.moves and isinstance(record.moves[0], Move):
+            self._board.set_position(*record.start[1:])
+            turn = record.start.turn
+            for move in record.moves:
+                codes.append(encode_move(move, self._board, turn))
+                self._board.make_move(move)
+                turn = other(turn)
+        else:
+            codes = record.moves
+        self._file.write(GAME.pack(*record.start[1:], record.start.turn == BLUE, record.forced_capture,
+                                   WINNER_CODES[record.winner], len(codes)))
+        self._file.write(struct.pack('<%dH' % len(codes), *codes))
+        self.games += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RecordReader:
+    """
+    Reads a binary record file a game at a time. Iterating yields GameRecords whose moves are the move codes;
+    replay() turns them into Moves.
+    """
+
+    def __init__(self, path, buffer_size=1 << 20):
+        self._file = open(path, 'rb', buffering=buffer_size)
+        magic, version = HEADER.unpack(self._file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a version %d game record file' % (path, VERSION))
+
+    def __iter__(self):
+        while True:
+            data = self._file.read(GAME.size)
+            if not data:
+                return
+            if len(data) < GAME.size:
+                raise ValueError('game record file ends in the middle of a game')
+            red_men, red_kings, blue_men, blue_kings, blue, forced, winner, count = GAME.unpack(data)
+            data = self._file.read(2 * count)
+            if len(data) < 2 * count:
+                raise ValueError('game record file ends in the middle of a game')
+            yield GameRecord(Position(BLUE if blue else RED, red_men, red_kings, blue_men, blue_kings),
+                             struct.unpack('<%dH' % count, data), CODE_WINNERS[winner], bool(forced))
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+##Files##
+
+def json_record(fields, forced_capture=False):
+    """Returns the GameRecord of a JSON game record (see book.py), already parsed into fields."""
+    board = Board()
+    board.set_position(*START[1:])
+    turn = START.turn
+    moves = []
+    for start, path in fields['moves']:
+        path = tuple(path)
+        for move in board.generate_moves(turn, forced_capture):
+            if move.start == start and move.path == path:
+                break
+        else:
+            raise ValueError('illegal move %r in game record' % ([start, list(path)],))
+        board.make_move(move)
+        moves.append(move)
+        turn = other(turn)
+    return GameRecord(START, moves, {'red': RED, 'blue': BLUE}.get(fields['winner']), forced_capture)
+
+
+def read_json_records(lines, forced_capture=False):
+    """Yields a GameRecord for every JSON lines game record of lines."""
+    for line in lines:
+        if line.strip():
+            yield json_record(json.loads(line), forced_capture)
+
+
+def read_records(path, forced_capture=False):
+    """Yields the GameRecords of a .bin, .pdn or JSON lines file, with their moves as Moves."""
+    if path.endswith('.bin'):
+        with RecordReader(path) as reader:
+            for record in reader:
+                yield record._replace(moves=[move for position, move in replay(record)])
+    elif path.endswith('.pdn'):
+        with open(path) as file:
+            for tags, record in read_pdn(file.read(), forced_capture):
+                yield record
+    else:
+        with open(path) as file:
+            yield from read_json_records(file, forced_capture)
+
+
+def convert(args):
+    count = 0
+    if args.output.endswith('.bin'):
+        with RecordWriter(args.output) as writer:
+            for record in read_records(args.input, args.forced_capture):
+                writer.write(record)
+                count += 1
+    elif args.output.endswith('.pdn'):
+        with open(args.output, 'w') as file:
+            for record in read_records(args.input, args.forced_capture):
+                file.write(('\n' if count else '') + write_pdn(record, {'Round': count + 1}))
+                count += 1
+    else:
+        with open(args.output, 'w') as file:
+            for record in read_records(args.input, args.forced_capture):
+                file.write(json.dumps({'moves': [[move.start, list(move.path)] for move in record.moves],
+                                       'winner': {RED: 'red', BLUE: 'blue'}.get(record.winner)}) + '\n')
+                count += 1
+    print('%d games written to %s' % (count, args.output), file=sys.stderr)
+
+
+def fen(args):
+    for index, record in enumerate(read_records(args.input, args.forced_capture)):
+        if index == args.game:
+            for position, move in replay(record):
+                print('%-72s %s' % (to_fen(position), move_to_pdn(move)))
+            return
+    sys.exit('%s has no game %d' % (args.input, args.game))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('convert', help='convert game records between .bin, .pdn and JSON lines')
+    command.add_argument('input')
+    command.add_argument('output')
+    command.set_defaults(run=convert)
+
+    command = commands.add_parser('fen', help='print the FEN of every position of a game and the move played')
+    command.add_argument('input')
+    command.add_argument('--game', type=int, default=0, help='which game of the file, from 0')
+    command.set_defaults(run=fen)
+
+    for command in commands.choices.values():
+        command.add_argument('--forced-capture', action='store_true',
+                             help='the games were played with forced captures (records in .bin and .pdn say so)')
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
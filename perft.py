@@ -0,0 +1,181 @@
+"""
+perft.py
+
+Counts the positions the move generator reaches at each depth, to check it against known numbers
+after changing it, and to time it.
+
+    python3 perft.py --depth 7 --forced-capture
+    python3 perft.py --depth 5 --position middlegame --divide
+    python3 perft.py --depth 4 --slow
+
+The counts for the start position with forced captures are the published perft numbers for
+English draughts up to perft(8). From perft(9) on they differ (3963629 against 3963680), because
+here a man crowned in the middle of a jump keeps jumping as a king, where the official rules end
+the move. The rest were computed with both generators below and agree. A move is one complete
+jump chain or one step, and every way of continuing a chain counts as its own move.
+
+--slow plays the moves square by square through Board.legal_moves(), move_piece() and
+remove_piece() the way the game window does, instead of generate_moves() and make_move().
+"""
+
+import argparse
+import sys
+from time import perf_counter
+
+from engine import Board, RED, BLUE, RED_START, BLUE_START, SQUARES, SQUARE_BITS, JUMPED
+
+##POSITIONS##
+# name, side to move, red men, red kings, blue men, blue kings
+POSITIONS = [
+    ('start', BLUE, RED_START, 0x0, BLUE_START, 0x0),
+    ('opening', RED, 0x31011313, 0x0, 0x84b8c8c8, 0x0),
+    ('middlegame', RED, 0x4130321, 0x0, 0x50cc2484, 0x0),
+    ('kings', BLUE, 0x20422113, 0x0, 0x880cc88, 0x1000000),
+    ('late', RED, 0x22200401, 0x80000, 0x40004084, 0x1000100),
+    ('crowning', RED, 0x1012, 0x800000, 0x1000848c, 0x100000),
+    ('king-endgame', RED, 0x0, 0x2004008, 0x0, 0x100200),
+]
+
+# REFERENCE[(name, forced capture)] = [perft(1), perft(2), ...]
+REFERENCE = {
+    ('start', False): [7, 49, 379, 2872, 23582, 189143, 1583148],
+    ('start', True): [7, 49, 302, 1469, 7361, 36768, 179740, 845931, 3963629],
+    ('opening', False): [8, 70, 572, 5111, 42092, 379242, 3151756],
+    ('opening', True): [3, 10, 17, 85, 409, 2340, 10695, 54561, 245880, 1244726, 5615366],
+    ('middlegame', False): [7, 69, 458, 4542, 31262, 307997, 2138317],
+    ('middlegame', True): [1, 4, 5, 26, 121, 534, 2762, 13785, 71341, 364118, 1933508],
+    ('kings', False): [10, 83, 846, 6842, 70219, 561939, 5785516],
+    ('kings', True): [1, 1, 2, 14, 119, 661, 4737, 25205, 167872, 830011, 5121359],
+    ('late', False): [8, 79, 674, 6440, 53224, 505398, 4117668],
+    ('late', True): [8, 20, 97, 521, 2756, 16398, 96051, 593031, 3489928],
+    ('crowning', False): [6, 73, 453, 4858, 30510, 304834, 1911155],
+    ('crowning', True): [6, 41, 190, 1162, 5479, 35746, 157705, 956272, 4355776],
+    ('king-endgame', False): [10, 76, 711, 4933, 43733, 271892, 2387512],
+    ('king-endgame', True): [1, 4, 25, 87, 606, 1460, 9285, 33350, 253415, 620379, 4231662],
+}
+
+
+def perft(board, turn, depth, forced_capture=False):
+    """Returns the number of positions depth plies after board with turn to move."""
+    moves = board.generate_moves(turn, forced_capture)
+    if depth == 1:
+        return len(moves)
+    other = RED if turn == BLUE else BLUE
+    nodes = 0
+    for move in moves:
+        undo = board.make_move(move)
+        nodes += perft(board, other, depth - 1, forced_capture)
+        board.unmake_move(undo)
+    return nodes
+
+
+def slow_moves(board, turn, forced_capture=False):
+    """
+    Returns the moves of turn as [start, end of each hop, ...] coordinate lists, found with legal_moves()
+    one square and one hop at a time.
+    """
+    moves = []
+    jumps = []
+    for x, y in SQUARES:
+        occupant = board.location(x, y).occupant
+        if occupant is None or occupant.color != turn:
+            continue
+        for end in board.legal_moves(x, y):
+            if abs(end[0] - x) == 2:
+                for chain in slow_chains(board, (x, y), end):
+                    moves.append(chain)
+                    jumps.append(chain)
+            else:
+                moves.append([(x, y), end])
+    if forced_capture and jumps:
+        return jumps
+    return moves
+
+
+def slow_chains(board, start, end):
+    # every way of finishing the jump from start to end, as coordinate lists starting at start
+    undo = board.state()
+    board.move_piece(start[0], start[1], end[0], end[1])
+    board.remove_piece((start[0] + end[0]) // 2, (start[1] + end[1]) // 2)
+    chains = []
+    for landing in board.legal_moves(end[0], end[1], True):
+        chains += [[start] + chain for chain in slow_chains(board, end, landing)]
+    board.unmake_move(undo)
+    return chains or [[start, end]]
+
+
+def slow_play(board, chain):
+    for start, end in zip(chain, chain[1:]):
+        board.move_piece(start[0], start[1], end[0], end[1])
+        if (SQUARE_BITS[start], SQUARE_BITS[end]) in JUMPED:
+            board.remove_piece((start[0] + end[0]) // 2, (start[1] + end[1]) // 2)
+
+
+def slow_perft(board, turn, depth, forced_capture=False):
+    """perft() through legal_moves(), move_piece() and remove_piece()."""
+    moves = slow_moves(board, turn, forced_capture)
+    if depth == 1:
+        return len(moves)
+    other = RED if turn == BLUE else BLUE
+    nodes = 0
+    for chain in moves:
+        undo = board.state()
+        slow_play(board, chain)
+        nodes += slow_perft(board, other, depth - 1, forced_capture)
+        board.unmake_move(undo)
+    return nodes
+
+
+def divide(board, turn, depth, forced_capture=False):
+    """Returns [(move as coordinates, perft(depth - 1) after it), ...] for every move of turn."""
+    other = RED if turn == BLUE else BLUE
+    counts = []
+    for move in board.generate_moves(turn, forced_capture):
+        undo = board.make_move(move)
+        counts.append((move.coords(), perft(board, other, depth - 1, forced_capture) if depth > 1 else 1))
+        board.unmake_move(undo)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--position', choices=[position[0] for position in POSITIONS],
+                        help='only this position (default: all of them)')
+    parser.add_argument('--forced-capture', action='store_true', help='a player must jump when they can')
+    parser.add_argument('--divide', action='store_true', help='print the count below every root move at --depth')
+    parser.add_argument('--slow', action='store_true', help='generate and play moves square by square')
+    args = parser.parse_args()
+
+    count = slow_perft if args.slow else perft
+    board = Board()
+    failed = False
+    for name, turn, red_men, red_kings, blue_men, blue_kings in POSITIONS:
+        if args.position and name != args.position:
+            continue
+        board.set_position(red_men, red_kings, blue_men, blue_kings)
+        print(name)
+        if args.divide:
+            total = 0
+            for coords, nodes in divide(board, turn, args.depth, args.forced_capture):
+                print('  %-30s %12d' % (' '.join('%d,%d' % square for square in coords), nodes))
+                total += nodes
+            print('  %-30s %12d' % ('total', total))
+            continue
+        reference = REFERENCE.get((name, args.forced_capture), [])
+        for depth in range(1, args.depth + 1):
+            start = perf_counter()
+            nodes = count(board, turn, depth, args.forced_capture)
+            seconds = perf_counter() - start
+            if depth <= len(reference):
+                check = 'ok' if nodes == reference[depth - 1] else 'MISMATCH, expected %d' % reference[depth - 1]
+                failed = failed or nodes != reference[depth - 1]
+            else:
+                check = ''
+            print('  perft(%d) = %12d  %8.2f s  %10.0f nodes/s  %s' % (
+                depth, nodes, seconds, nodes / seconds if seconds else 0, check))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+"""
+server.py
+
+Hosts many headless games at once for clients on a TCP or Unix socket, with the bot moves searched
+by a pool of worker processes, and a load generator to measure it.
+
+    python3 server.py serve --port 7777 --workers 4
+    python3 server.py serve --unix /tmp/checkers.sock
+    python3 server.py load --port 7777 --games 1000 --bot '{"method": "alpha_beta", "depth": 2}'
+
+The protocol is JSON lines. Every request is an object with an "op" and, optionally, an "id" that
+is copied into the response. Every response has "ok", and "error" when it is false.
+
+    {"op": "new", "bot": {Bot arguments, in place of DEFAULT_BOT's}, "forced_capture": false, "deadline_ms": 1000}
+        -> {"game": id, "board": [red men, red kings, blue men, blue kings], "turn": "blue"}
+    {"op": "bot", "game": id, "deadline_ms": 500}     the bot plays the side to move
+        -> {"move": [start, [landing squares]], "nodes": n, "ms": search time, "board", "turn", "over", "winner"}
+    {"op": "move", "game": id, "move": [start, [landing squares]]}     the client plays the side to move
+        -> {"board", "turn", "over", "winner"}
+    {"op": "state", "game": id}  -> {"board", "turn", "over", "winner", "moves": [legal moves]}
+    {"op": "close", "game": id}
+
+Squares are bit numbers (see engine.SQUARES). The games belong to the connection that made them and
+end with it. A bot move has to be answered within the game's deadline_ms, counted from when the
+request is read, waiting for the pool included; otherwise the response is the error "deadline", the
+move is not played and the worker stops searching it. A time-limited bot is given at most the time
+left. At most --max-pending bot moves are queued for or running in the pool: while the pool is that
+full the server stops reading requests from a connection that wants another one, so clients are
+slowed down instead of the queue growing.
+
+Clients can not make a worker open files or search without end: "book" and "tablebase" name files
+the server was started with, and depth, tt_size_mb, time_limit_ms and max_quiescence have upper
+limits (see LIMITS and --limit).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter, time
+
+from analysis import position_bot
+from engine import Board, GameState, Position, RED, BLUE
+from gamebot import SearchTimeout
+
+# Bot arguments a client may set. book and tablebase are names the server was started with (--book,
+# --tablebase), never paths.
+BOT_ARGS = ('method', 'mid_eval', 'end_eval', 'depth', 'tt_size_mb', 'time_limit_ms', 'move_ordering', 'batch_eval',
+            'tablebase', 'book', 'book_depth', 'quiescence', 'max_quiescence', 'aspiration_window')
+
+# the smallest and largest value a client may give the Bot arguments that cost time or memory;
+# --limit raises or lowers the largest
+LIMITS = {'depth': (1, 8), 'tt_size_mb': (0, 64), 'time_limit_ms': (1, 5000), 'max_quiescence': (0, 16)}
+
+# a new game's bot: these arguments, with the ones the client sets in place of them
+DEFAULT_BOT = {'method': 'alpha_beta', 'mid_eval': 'piece_and_board', 'depth': 3}
+
+# the names the string Bot arguments can take; end_eval can also be left out
+CHOICES = {'method': ('random', 'minmax', 'alpha_beta', 'pvs'),
+           'mid_eval': ('piece2val', 'piece_and_row', 'piece_and_board', 'piece_and_board_pov'),
+           'end_eval': ('sum_of_dist', 'farthest_piece', None)}
+
+COLOR_NAMES = {RED: 'red', BLUE: 'blue'}
+
+
+class RequestError(Exception):
+    """A request that can not be carried out; its message is sent back as the error."""
+
+
+def play_bot_move(job):
+    """
+    Runs in a worker process: searches one bot move. Returns ([start, path], nodes, seconds) or None
+    when the side to move has no move. Raises RequestError('deadline') if the search is not done by
+    deadline (a time.time()), so a late move does not keep the worker.
+    """
+    state, turn, forced_capture, config, book_moves, deadline = job
+    left = deadline - time()
+    if left <= 0:
+        raise RequestError('deadline')
+    bot = position_bot(Position(turn, *state), forced_capture, config)
+    bot._book_moves = book_moves
+    bot.last_move = None
+    start = perf_counter()
+    # a fixed-depth search stops at the deadline; a time-limited one is given less than the time left
+    bot._deadline = start + left
+    try:
+        nodes = bot.step(bot.game.board, True)
+    except SearchTimeout:
+        bot.color, bot.adversary_color = turn, RED if turn == BLUE else BLUE
+        raise RequestError('deadline')
+    finally:
+        bot._deadline = None
+    seconds = perf_counter() - start
+    if bot.last_move is None:
+        return None
+    return [bot.last_move.start, list(bot.last_move.path)], nodes or 0, seconds
+
+
+def check_request(request):
+    """Raises RequestError if the game or deadline_ms of request is not a number it can be."""
+    game = request.get('game')
+    if game is not None and type(game) is not int:
+        raise RequestError('game must be a game id, not %r' % (game,))
+    deadline_ms = request.get('deadline_ms')
+    if deadline_ms is not None and (type(deadline_ms) not in (int, float) or not 0 < deadline_ms < float('inf')):
+        raise RequestError('deadline_ms must be a positive number, not %r' % (deadline_ms,))
+
+
+class ServerGame:
+    def __init__(self, config, forced_capture, deadline_ms):
+        self.state = GameState(Board(), BLUE, forced_capture)
+        self.config = config
+        self.deadline_ms = deadline_ms
+        self.bot_moves = {RED: 0, BLUE: 0}
+        self.busy = False
+
+    def play(self, move):
+        """Plays move, [start, path], for the side to move."""
+        if self.state.endit:
+            raise RequestError('the game is over')
+        start, path = move[0], tuple(move[1])
+        for legal in self.state.board.generate_moves(self.state.turn, self.state.forced_capture):
+            if legal.start == start and legal.path == path:
+                self.state.board.make_move(legal)
+                self.state.end_turn()
+                return
+        raise RequestError('illegal move %r' % (move,))
+
+    def describe(self):
+        winner = None
+        if self.state.endit:
+            # the side left to move has no moves and lost
+            winner = COLOR_NAMES[RED if self.state.turn == BLUE else BLUE]
+        return {'board': list(self.state.board.state()[:4]), 'turn': COLOR_NAMES[self.state.turn],
+                'over': self.state.endit, 'winner': winner}
+
+
+class GameServer:
+    def __init__(self, workers, max_pending, deadline_ms, limits=LIMITS, books=None, tablebases=None):
+        self._pool = ProcessPoolExecutor(workers)
+        self._slots = asyncio.Semaphore(max_pending)
+        self.deadline_ms = deadline_ms
+        self.limits = limits
+        self.files = {'book': books or {}, 'tablebase': tablebases or {}}  # name -> path
+        self._games = {}
+        self._next_game = 1
+
+    async def handle(self, reader, writer):
+        # One connection: requests are read in order and answered as they finish, bot moves concurrently.
+        games = set()
+        tasks = set()
+        write_lock = asyncio.Lock()
+
+        async def respond(request, response):
+            if writer.is_closing():
+                return
+            if 'id' in request:
+                response['id'] = request['id']
+            writer.write((json.dumps(response) + '\n').encode())
+            async with write_lock:
+                await writer.drain()
+
+        async def serve(request, arrived, slot):
+            try:
+                response = await self._request(request, arrived, slot, games)
+                response['ok'] = True
+            except RequestError as error:
+                response = {'ok': False, 'error': str(error)}
+            except Exception as error:
+                response = {'ok': False, 'error': '%s: %s' % (type(error).__name__, error)}
+            await respond(request, response)
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                arrived = perf_counter()
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError('a request must be a JSON object')
+                except ValueError as error:
+                    await respond({}, {'ok': False, 'error': 'bad request: %s' % error})
+                    continue
+                try:
+                    check_request(request)
+                except RequestError as error:
+                    await respond(request, {'ok': False, 'error': str(error)})
+                    continue
+                slot = False
+                if request.get('op') == 'bot':
+                    # backpressure: no more reading from this connection until the pool has room
+                    slot = await self._wait_for_slot(request, arrived, games)
+                    if not slot:
+                        await respond(request, {'ok': False, 'error': 'deadline'})
+                        continue
+                task = asyncio.create_task(serve(request, arrived, slot))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            for game in games:
+                self._games.pop(game, None)
+            writer.close()
+
+    async def _wait_for_slot(self, request, arrived, games):
+        # True once a pool slot is taken for the bot move, False if the game's deadline passed first
+        game = self._games.get(request.get('game')) if request.get('game') in games else None
+        deadline_ms = request.get('deadline_ms', game.deadline_ms if game else self.deadline_ms)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), max(0, deadline_ms / 1000 - (perf_counter() - arrived)))
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def _game(self, request, games):
+        if request.get('game') not in games:
+            raise RequestError('no game %r' % request.get('game'))
+        return self._games[request['game']]
+
+    async def _request(self, request, arrived, slot, games):
+        op = request.get('op')
+        if op == 'bot':
+            return await self._bot_move(self._game(request, games), request, arrived, slot)
+        if op == 'new':
+            config = self._bot_config(request.get('bot', {}))
+            game_id = self._next_game
+            self._next_game += 1
+            game = ServerGame(config, bool(request.get('forced_capture', False)),
+                              request.get('deadline_ms', self.deadline_ms))
+            self._games[game_id] = game
+            games.add(game_id)
+            return dict(game.describe(), game=game_id)
+        if op == 'move':
+            game = self._game(request, games)
+            if game.busy:
+                raise RequestError('the bot is moving in this game')
+            game.play(request['move'])
+            return game.describe()
+        if op == 'state':
+            game = self._game(request, games)
+            moves = game.state.board.generate_moves(game.state.turn, game.state.forced_capture)
+            return dict(game.describe(), moves=[[move.start, list(move.path)] for move in moves])
+        if op == 'close':
+            self._game(request, games)
+            del self._games[request['game']]
+            games.discard(request['game'])
+            return {}
+        raise RequestError('unknown op %r' % op)
+
+    def _bot_config(self, config):
+        # the Bot arguments of a new game, checked against BOT_ARGS and the limits, with files named by path
+        if not isinstance(config, dict):
+            raise RequestError('bot must be a JSON object')
+        unknown = set(config) - set(BOT_ARGS)
+        if unknown:
+            raise RequestError('unknown bot arguments %s' % ', '.join(sorted(unknown)))
+        config = dict(DEFAULT_BOT, **config)
+        for key, choices in CHOICES.items():
+            if config.get(key) not in choices:
+                raise RequestError('%s must be one of %s, not %r' % (
+                    key, ', '.join(choice for choice in choices if choice is not None), config.get(key)))
+        for key, (lowest, highest) in self.limits.items():
+            value = config.get(key)
+            if value is not None and (type(value) is not int or not lowest <= value <= highest):
+                raise RequestError('%s must be a whole number from %d to %d' % (key, lowest, highest))
+        for key, paths in self.files.items():
+            if config.get(key) is not None:
+                if config[key] not in paths:
+                    raise RequestError('no %s named %r on this server' % (key, config[key]))
+                config[key] = paths[config[key]]
+        return config
+
+    async def _bot_move(self, game, request, arrived, slot):
+        loop = asyncio.get_running_loop()
+        release = True
+        try:
+            if game.busy:
+                raise RequestError('the bot is moving in this game')
+            if game.state.endit:
+                raise RequestError('the game is over')
+            deadline_ms = request.get('deadline_ms', game.deadline_ms)
+            left = deadline_ms / 1000 - (perf_counter() - arrived)
+            config = dict(game.config)
+            if config.get('time_limit_ms') is not None:
+                config['time_limit_ms'] = max(1, min(config['time_limit_ms'], int(left * 1000 * 0.8)))
+            turn = game.state.turn
+            job = (game.state.board.state()[:4], turn, game.state.forced_capture, config, game.bot_moves[turn],
+                   time() + left)
+            future = self._pool.submit(play_bot_move, job)
+            # the slot is held until the worker is done with the job, even when the answer comes too late
+            future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._slots.release))
+            release = False
+            game.busy = True
+            try:
+                result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), max(0, left))
+            except asyncio.TimeoutError:
+                raise RequestError('deadline')
+            finally:
+                game.busy = False
+            if result is None:
+                raise RequestError('no legal move')
+            move, nodes, seconds = result
+            game.play(move)
+            game.bot_moves[turn] += 1
+            return dict(game.describe(), move=move, nodes=nodes, ms=1000 * seconds)
+        finally:
+            if release and slot:
+                self._slots.release()
+
+    def close(self):
+        self._pool.shutdown(cancel_futures=True)
+
+
+async def serve(args):
+    limits = dict(LIMITS)
+    for key, highest in args.limit:
+        if key not in limits:
+            raise SystemExit('--limit: no limit on %r (there are %s)' % (key, ', '.join(sorted(limits))))
+        limits[key] = (limits[key][0], int(highest))
+    server = GameServer(args.workers, args.max_pending or 2 * args.workers, args.deadline_ms, limits,
+                        dict(args.book), dict(args.tablebase))
+    if args.unix:
+        listener = await asyncio.start_unix_server(server.handle, path=args.unix, limit=1 << 20)
+        where = args.unix
+    else:
+        listener = await asyncio.start_server(server.handle, args.host, args.port, limit=1 << 20)
+        where = '%s:%d' % (args.host, args.port)
+    print('serving on %s with %d workers' % (where, args.workers))
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+class Client:
+    """A connection to the server that matches responses to requests by id, so requests can overlap."""
+
+    async def connect(self, args):
+        if args.unix:
+            self._reader, self._writer = await asyncio.open_unix_connection(args.unix, limit=1 << 20)
+        else:
+            self._reader, self._writer = await asyncio.open_connection(args.host, args.port, limit=1 << 20)
+        self._waiting = {}
+        self._next_id = 0
+        self._receiver = asyncio.create_task(self._receive())
+
+    async def _receive(self):
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                break
+            response = json.loads(line)
+            self._waiting.pop(response.get('id')).set_result(response)
+        for future in self._waiting.values():
+            future.set_exception(ConnectionError('the server closed the connection'))
+
+    async def request(self, **request):
+        self._next_id += 1
+        request['id'] = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[self._next_id] = future
+        self._writer.write((json.dumps(request) + '\n').encode())
+        await self._writer.drain()
+        return await future
+
+    async def close(self):
+        self._writer.close()
+        self._receiver.cancel()
+
+
+async def load_game(client, args, latencies, errors):
+    # one game of bot against bot, both moved by the server
+    game = await client.request(op='new', bot=args.bot, forced_capture=args.forced_capture,
+                                deadline_ms=args.deadline_ms)
+    for _ in range(args.max_plies):
+        start = perf_counter()
+        response = await client.request(op='bot', game=game['game'])
+        if not response['ok']:
+            errors[response['error']] = errors.get(response['error'], 0) + 1
+            if response['error'] == 'deadline':
+                continue
+            break
+        latencies.append(perf_counter() - start)
+        if response['over']:
+            break
+    await client.request(op='close', game=game['game'])
+
+
+async def load(args):
+    clients = []
+    for _ in range(args.connections):
+        client = Client()
+        await client.connect(args)
+        clients.append(client)
+    latencies = []
+    errors = {}
+    running = asyncio.Semaphore(args.concurrency)
+
+    async def one_game(index):
+        async with running:
+            await load_game(clients[index % len(clients)], args, latencies, errors)
+
+    start = perf_counter()
+    await asyncio.gather(*(one_game(index) for index in range(args.games)))
+    seconds = perf_counter() - start
+    for client in clients:
+        await client.close()
+
+    latencies.sort()
+
+    def percentile(share):
+        return 1000 * latencies[min(len(latencies) - 1, int(share * len(latencies)))] if latencies else 0
+
+    print('%d games, %d moves in %.1f s: %.0f moves/s' % (args.games, len(latencies), seconds, len(latencies) / seconds))
+    print('move latency p50 %.1f ms, p99 %.1f ms, max %.1f ms' % (
+        percentile(0.5), percentile(0.99), 1000 * latencies[-1] if latencies else 0))
+    for error, count in sorted(errors.items()):
+        print('%d errors: %s' % (count, error))
+
+
+def name_value(text):
+    name, separator, value = text.partition('=')
+    if not separator:
+        raise argparse.ArgumentTypeError('expected NAME=VALUE, got %r' % text)
+    return name, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, help in (('serve', 'run the server'), ('load', 'play games against a running server and time them')):
+        command = commands.add_parser(name, help=help)
+        command.add_argument('--host', default='127.0.0.1')
+        command.add_argument('--port', type=int, default=7777)
+        command.add_argument('--unix', help='Unix socket path, instead of TCP')
+        command.add_argument('--deadline-ms', type=int, default=5000, help='time allowed for a bot move')
+
+    command = commands.choices['serve']
+    command.add_argument('--workers', type=int, default=os.cpu_count(), help='search processes (default: one per core)')
+    command.add_argument('--max-pending', type=int, help='bot moves queued or running at once (default: 2 per worker)')
+    command.add_argument('--limit', type=name_value, action='append', default=[], metavar='ARG=MAX',
+                         help='the largest value clients may give a Bot argument, e.g. depth=10 (default: %s)'
+                         % ', '.join('%s=%d' % (key, limit[1]) for key, limit in sorted(LIMITS.items())))
+    command.add_argument('--book', type=name_value, action='append', default=[], metavar='NAME=PATH',
+                         help='an opening book clients may use as "book": NAME')
+    command.add_argument('--tablebase', type=name_value, action='append', default=[], metavar='NAME=PATH',
+                         help='an endgame tablebase clients may use as "tablebase": NAME')
+    command.set_defaults(run=serve)
+
+    command = commands.choices['load']
+    command.add_argument('--games', type=int, default=1000)
+    command.add_argument('--concurrency', type=int, default=1000, help='games in progress at once')
+    command.add_argument('--connections', type=int, default=4)
+    command.add_argument('--max-plies', type=int, default=100)
+    command.add_argument('--forced-capture', action='store_true', help='a player must jump when they can')
+    command.add_argument('--bot', type=json.loads, default={'method': 'alpha_beta', 'mid_eval': 'piece_and_board', 'depth': 2},
+                         help='Bot arguments as a JSON object')
+    command.set_defaults(run=load)
+
+    args = parser.parse_args()
+    try:
+        asyncio.run(args.run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+tablebase.py
+
+Endgame tables for positions with kings only: for every position of up to --pieces kings and either
+side to move, whether the side to move wins, loses or draws with best play and in how many plies.
+
+    python3 tablebase.py build --pieces 4 --output kings4.tb
+    python3 tablebase.py probe kings4.tb --red 0,5 --blue 31 --turn red
+
+Tables are built smallest first by retrograde analysis. A capture always leads into a smaller table,
+so only king slides connect positions of the same table, and a slide can be taken back by sliding
+the same king back. The positions where the side to move is stuck are losses in 0; every position
+that can slide into a loss in n is a win in n + 1, and a position all of whose moves lead into wins
+is a loss in one more ply than its longest one. What is never reached is a draw.
+
+File layout (little-endian):
+    header  b'CKTB', version (B), forced capture (B), pieces (B), pad (B)
+    offsets for every (red kings, blue kings) table, in tables() order (Q each)
+    tables  one byte per position and side to move, see Tablebase.probe() for the index and value
+"""
+
+import argparse
+import mmap
+import struct
+from itertools import combinations
+from time import perf_counter
+
+from engine import Board, RED, BLUE, NEIGHBOURS, DIRECTIONS, bits
+
+MAGIC = b'CKTB'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBB')
+
+##RESULTS##
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+# the longest win or loss a table byte can hold
+MAX_PLIES = 254
+
+# BINOMIAL[n][k] = n choose k, for ranking sets of squares
+BINOMIAL = [[0] * 33 for _ in range(33)]
+for n in range(33):
+    BINOMIAL[n][0] = 1
+    for k in range(1, n + 1):
+        BINOMIAL[n][k] = BINOMIAL[n - 1][k - 1] + BINOMIAL[n - 1][k]
+
+
+def tables(pieces):
+    """Returns the (red kings, blue kings) counts of every table with up to pieces kings, smallest first."""
+    return [(red, total - red) for total in range(2, pieces + 1) for red in range(1, total)]
+
+
+def table_size(red, blue):
+    """Number of entries in the table: red square sets * blue square sets * 2 sides to move."""
+    return BINOMIAL[32][red] * BINOMIAL[32 - red][blue] * 2
+
+
+def rank(red_kings, blue_kings, turn):
+    """
+    Index of a position in its table. The red squares and then the blue squares, numbered among the
+    squares red does not hold, are ranked in the combinatorial number system; red to move comes first.
+    """
+    red_rank = 0
+    for i, bit in enumerate(bits(red_kings)):
+        red_rank += BINOMIAL[bit][i + 1]
+    blue_rank = 0
+    for i, bit in enumerate(bits(blue_kings)):
+        bit -= (red_kings & ((1 << bit) - 1)).bit_count()
+        blue_rank += BINOMIAL[bit][i + 1]
+    blue_sets = BINOMIAL[32 - red_kings.bit_count()][blue_kings.bit_count()]
+    return (red_rank * blue_sets + blue_rank) * 2 + (0 if turn == RED else 1)
+
+
+def decode(value):
+    """Turns a table byte into (WIN, LOSS or DRAW, plies), for the side to move."""
+    if value == 0:
+        return DRAW, 0
+    plies = value - 1
+    return (WIN if plies % 2 else LOSS), plies
+
+
+class Tablebase:
+    """
+    A tablebase file mapped into memory. Probing reads one byte of the mapping, so only the pages
+    that are used end up in memory.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, forced_capture, pieces, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a version %d tablebase' % (path, VERSION))
+        self.forced_capture = bool(forced_capture)
+        self.pieces = pieces
+        self._tables = tables(pieces)
+        offsets = struct.unpack_from('<%dQ' % len(self._tables), self._map, HEADER.size)
+        self._offsets = dict(zip(self._tables, offsets))
+
+    def covers(self, board):
+        """True when the position has only kings, of both colors, and no more than the table holds."""
+        if board.red_men or board.blue_men or not board.red_kings or not board.blue_kings:
+            return False
+        return board.red_kings.bit_count() + board.blue_kings.bit_count() <= self.pieces
+
+    def probe(self, board, turn):
+        """
+        Returns (WIN, LOSS or DRAW, plies) for turn to move on board, where plies counts the moves of both
+        sides until the loser has no move left. The board must be covered().
+        """
+        red_kings, blue_kings = board.red_kings, board.blue_kings
+        offset = self._offsets[(red_kings.bit_count(), blue_kings.bit_count())]
+        return decode(self._map[offset + rank(red_kings, blue_kings, turn)])
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def solve_table(red, blue, solved, forced_capture):
+    """
+    Retrograde analysis of the table with red and blue kings. solved maps the smaller tables to their
+    bytearrays. Returns the table as a bytearray of encoded values (see decode()).
+    """
+    size = table_size(red, blue)
+    values = bytearray(size)
+    slides = bytearray(size)   # slide moves whose result is not known yet
+    slides_legal = bytearray(size)
+    worst = bytearray(size)    # plies of the longest loss found so far, as value - 1
+    not_lost = bytearray(size) # a capture leads into a draw or a win, so this can not be a loss
+    buckets = [[] for _ in range(MAX_PLIES + 2)]
+    board = Board()
+
+    def child_value(turn):
+        # value of the position on board after a capture, for turn (the side to move after it)
+        own = board.red_kings if turn == RED else board.blue_kings
+        if not own:
+            return 1  # loss in 0, nothing left to move
+        table = (board.red_kings.bit_count(), board.blue_kings.bit_count())
+        return solved[table][rank(board.red_kings, board.blue_kings, turn)]
+
+    for red_squares in combinations(range(32), red):
+        red_kings = sum(1 << bit for bit in red_squares)
+        free = [bit for bit in range(32) if not red_kings >> bit & 1]
+        for blue_squares in combinations(free, blue):
+            blue_kings = sum(1 << bit for bit in blue_squares)
+            board.set_position(0, red_kings, 0, blue_kings)
+            for turn in (RED, BLUE):
+                index = rank(red_kings, blue_kings, turn)
+                other = BLUE if turn == RED else RED
+                moves = board.generate_moves(turn, forced_capture)
+                if not moves:
+                    buckets[0].append((index, 1))
+                    continue
+                best_win = None
+                for move in moves:
+                    if not move.captured:
+                        slides[index] += 1
+                        continue
+                    undo = board.make_move(move)
+                    result, plies = decode(child_value(other))
+                    board.unmake_move(undo)
+                    if result == LOSS:
+                        best_win = plies + 1 if best_win is None else min(best_win, plies + 1)
+                        not_lost[index] = 1
+                    elif result == WIN:
+                        worst[index] = max(worst[index], plies + 1)
+                    else:
+                        not_lost[index] = 1
+                slides_legal[index] = 1 if slides[index] else 0
+                if best_win is not None:
+                    buckets[best_win].append((index, best_win + 1))
+                elif not slides[index] and not not_lost[index]:
+                    buckets[worst[index]].append((index, worst[index] + 1))
+
+    def predecessors(red_kings, blue_kings, turn):
+        # positions with the other side to move that slide into this one
+        mover = BLUE if turn == RED else RED
+        occupied = red_kings | blue_kings
+        for bit in bits(blue_kings if mover == BLUE else red_kings):
+            for direction in DIRECTIONS:
+                before = NEIGHBOURS[direction][bit]
+                if before is None or occupied >> before & 1:
+                    continue
+                moved = (1 << bit) | (1 << before)
+                if mover == RED:
+                    yield rank(red_kings ^ moved, blue_kings, RED)
+                else:
+                    yield rank(red_kings, blue_kings ^ moved, BLUE)
+
+    positions = unrank_all(red, blue)
+    for plies, bucket in enumerate(buckets):
+        for index, value in bucket:
+            if values[index]:
+                continue
+            values[index] = value
+            red_kings, blue_kings = positions[index >> 1]
+            turn = RED if index & 1 == 0 else BLUE
+            for before in predecessors(red_kings, blue_kings, turn):
+                if values[before] or not slides_legal[before]:
+                    continue
+                if value % 2:
+                    # this is a loss for the side to move, so sliding into it wins
+                    assert plies + 1 <= MAX_PLIES, 'win longer than a table byte holds'
+                    buckets[plies + 1].append((before, plies + 2))
+                else:
+                    slides[before] -= 1
+                    worst[before] = max(worst[before], plies + 1)
+                    if not slides[before] and not not_lost[before]:
+                        assert worst[before] <= MAX_PLIES, 'loss longer than a table byte holds'
+                        buckets[worst[before]].append((before, worst[before] + 1))
+    return values
+
+
+def unrank_all(red, blue):
+    """Returns [(red kings, blue kings), ...] indexed by rank() // 2."""
+    positions = [None] * (table_size(red, blue) // 2)
+    for red_squares in combinations(range(32), red):
+        red_kings = sum(1 << bit for bit in red_squares)
+        free = [bit for bit in range(32) if not red_kings >> bit & 1]
+        for blue_squares in combinations(free, blue):
+            blue_kings = sum(1 << bit for bit in blue_squares)
+            positions[rank(red_kings, blue_kings, RED) >> 1] = (red_kings, blue_kings)
+    return positions
+
+
+def build(args):
+    solved = {}
+    for red, blue in tables(args.pieces):
+        start = perf_counter()
+        solved[(red, blue)] = solve_table(red, blue, solved, args.forced_capture)
+        counts = {WIN: 0, LOSS: 0, DRAW: 0}
+        for value in solved[(red, blue)]:
+            counts[decode(value)[0]] += 1
+        print('%d v %d: %9d positions, %9d wins, %9d losses, %9d draws, %.1f s' % (
+            red, blue, len(solved[(red, blue)]), counts[WIN], counts[LOSS], counts[DRAW], perf_counter() - start))
+
+    with open(args.output, 'wb') as file:
+        order = tables(args.pieces)
+        file.write(HEADER.pack(MAGIC, VERSION, int(args.forced_capture), args.pieces, 0))
+        offset = HEADER.size + 8 * len(order)
+        for table in order:
+            file.write(struct.pack('<Q', offset))
+            offset += len(solved[table])
+        for table in order:
+            file.write(solved[table])
+    print('written to', args.output)
+
+
+def probe(args):
+    tablebase = Tablebase(args.file)
+    board = Board()
+    board.set_position(0, square_list(args.red), 0, square_list(args.blue))
+    if not tablebase.covers(board):
+        print('not in the tablebase')
+        return
+    result, plies = tablebase.probe(board, RED if args.turn == 'red' else BLUE)
+    print({WIN: 'win', LOSS: 'loss', DRAW: 'draw'}[result], 'in %d plies' % plies if result != DRAW else '')
+
+
+def square_list(text):
+    """Turns '0,5,31' into a mask of those squares."""
+    return sum(1 << int(bit) for bit in text.split(',') if bit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('build', help='solve every kings-only position up to --pieces kings')
+    command.add_argument('--pieces', type=int, default=4)
+    command.add_argument('--forced-capture', action='store_true', help='a player must jump when they can')
+    command.add_argument('--output', default='kings4.tb')
+    command.set_defaults(run=build)
+
+    command = commands.add_parser('probe', help='look up one position')
+    command.add_argument('file')
+    command.add_argument('--red', required=True, help='squares (bit numbers) of the red kings, comma separated')
+    command.add_argument('--blue', required=True, help='squares (bit numbers) of the blue kings, comma separated')
+    command.add_argument('--turn', choices=('red', 'blue'), default='red')
+    command.set_defaults(run=probe)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+The bot searches on one board with make_move() and unmake_move(): a search must leave the board as
+it found it and count the same nodes as the search that worked on a copy of the board per child.
+Principal variation search only prunes differently, so it must find the same root scores as alpha-beta,
+and the batched leaf evals must score every position as the scalar evals do.
+"""
+
+import contextlib
+import copy
+import io
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import gamebot
+from engine import Board, GameState, RED, BLUE
+from perft import POSITIONS
+
+CONFIGS = {
+    'minimax': dict(method='minmax', mid_eval='piece2val', depth=2),
+    'alpha_beta': dict(method='alpha_beta', mid_eval='piece_and_board', end_eval='sum_of_dist', depth=3),
+    'alpha_beta_deep': dict(method='alpha_beta', mid_eval='piece_and_row', depth=4),
+    'alpha_beta_tt': dict(method='alpha_beta', mid_eval='piece_and_board_pov', end_eval='sum_of_dist', depth=4,
+                          tt_size_mb=1, move_ordering=True),
+}
+
+# nodes searched per move of the seeded self-play games below by the deepcopy search the bot had
+# before make/unmake, up to the first multi-jump with more than one way to continue, which that
+# search followed only one way of
+DEEPCOPY_NODES = {
+    ('minimax', 1): [56, 61, 69, 78, 70, 64, 71, 50, 55, 63, 56, 70, 61],
+    ('alpha_beta', 2): [400, 409, 437, 330, 412, 389, 290, 392, 259, 393, 312, 363, 222, 198, 229, 362, 241,
+                        384, 469, 293, 480, 348, 297, 317, 273, 607],
+}
+
+MID_EVALS = ['piece2val', 'piece_and_row', 'piece_and_board', 'piece_and_board_pov']
+
+
+class CopyBoard(Board):
+    """A Board that takes moves back by restoring a deep copy of itself, as searching on copies did."""
+
+    def make_move(self, move):
+        saved = copy.deepcopy(self.__dict__)
+        Board.make_move(self, move)
+        return saved
+
+    def unmake_move(self, undo):
+        if isinstance(undo, dict):
+            self.__dict__ = undo
+        else:
+            Board.unmake_move(self, undo)
+
+
+def self_play(config, seed, plies, board=None):
+    """Returns the nodes searched for each move and the final board state of a seeded self-play game."""
+    random.seed(seed)
+    game = GameState(board or Board())
+    bots = {BLUE: gamebot.Bot(game, BLUE, **config), RED: gamebot.Bot(game, RED, **config)}
+    nodes = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for ply in range(plies):
+            nodes.append(bots[game.turn].step(game.board, True))
+            if game.endit:
+                break
+    return nodes, game.board.state()
+
+
+@pytest.mark.parametrize('name', sorted(CONFIGS))
+@pytest.mark.parametrize('position', POSITIONS, ids=[position[0] for position in POSITIONS])
+def test_search_leaves_board_unchanged(name, position):
+    random.seed(0)
+    game = GameState(Board(), position[1])
+    game.board.set_position(*position[2:])
+    bots = {BLUE: gamebot.Bot(game, BLUE, **CONFIGS[name]), RED: gamebot.Bot(game, RED, **CONFIGS[name])}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for ply in range(10):
+            bot = bots[game.turn]
+            before = game.board.state()
+            if bot.method == 'minmax':
+                bot._minmax(bot.depth - 1, game.board, 'max')
+            else:
+                bot._new_search()
+                bot._alpha_beta(bot.depth - 1, game.board, 'max', alpha=-float('inf'), beta=float('inf'), root=True)
+            assert game.board.state() == before
+            assert game.turn == bot.color
+            bot.step(game.board)
+            if game.endit:
+                break
+
+
+@pytest.mark.parametrize('name', sorted(CONFIGS))
+def test_nodes_match_copy_search(name):
+    assert self_play(CONFIGS[name], 5, 30) == self_play(CONFIGS[name], 5, 30, CopyBoard())
+
+
+@pytest.mark.parametrize('name, seed', sorted(DEEPCOPY_NODES))
+def test_nodes_match_deepcopy_search(name, seed):
+    expected = DEEPCOPY_NODES[(name, seed)]
+    nodes, _ = self_play(CONFIGS[name], seed, len(expected))
+    assert nodes == expected
+
+
+def analysis_bot(position, forced_capture, method, mid_eval, **bot_args):
+    """Returns a bot of the side to move in position, on a game of its own."""
+    game = GameState(Board(), position[1], forced_capture)
+    game.board.set_position(*position[2:])
+    return gamebot.Bot(game, position[1], method=method, mid_eval=mid_eval, tt_size_mb=1, move_ordering=True,
+                       **bot_args)
+
+
+@pytest.mark.parametrize('forced_capture', [False, True])
+@pytest.mark.parametrize('depth', [2, 3, 4, 5])
+@pytest.mark.parametrize('mid_eval', MID_EVALS)
+@pytest.mark.parametrize('position', POSITIONS, ids=[position[0] for position in POSITIONS])
+def test_pvs_scores_match_alpha_beta(position, mid_eval, depth, forced_capture):
+    scores = {}
+    for method in ('alpha_beta', 'pvs'):
+        bot = analysis_bot(position, forced_capture, method, mid_eval)
+        with contextlib.redirect_stdout(io.StringIO()):
+            scores[method] = bot.analyze(bot.game.board, depth).score
+    assert scores['pvs'] == scores['alpha_beta']
+
+
+@pytest.mark.parametrize('offset', [-1000, -3, 3, 1000])
+@pytest.mark.parametrize('mid_eval', MID_EVALS)
+@pytest.mark.parametrize('position', POSITIONS, ids=[position[0] for position in POSITIONS])
+def test_aspiration_research_matches_alpha_beta(position, mid_eval, offset):
+    # a guess off by more than the window fails low or high and has to be searched again
+    depth = 4
+    bot = analysis_bot(position, False, 'alpha_beta', mid_eval)
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = bot.analyze(bot.game.board, depth).score
+    bot = analysis_bot(position, False, 'pvs', mid_eval, time_limit_ms=60000)
+    windows = []
+    alpha_beta = bot._alpha_beta
+
+    def root_search(depth, board, fn, alpha, beta, root=False, **kwargs):
+        if root:
+            windows.append((alpha, beta))
+        return alpha_beta(depth, board, fn, alpha, beta, root=root, **kwargs)
+
+    bot._alpha_beta = root_search
+    bot._new_search()
+    before = bot.game.board.state()
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, score = bot._aspiration_search(depth, bot.game.board, expected + offset)
+    assert score == expected
+    assert bot.game.board.state() == before
+    assert len(windows) == 2
+
+
+def random_positions(seed, games=5, plies=60):
+    """Returns the masks of the positions of a few seeded random games, kings and captures included."""
+    rng = random.Random(seed)
+    positions = [position[2:] for position in POSITIONS]
+    for _ in range(games):
+        game = GameState(Board())
+        for ply in range(plies):
+            moves = game.board.generate_moves(game.turn, game.forced_capture)
+            if not moves:
+                break
+            game.board.make_move(rng.choice(moves))
+            game.turn = RED if game.turn == BLUE else BLUE
+            positions.append(game.board.state()[:4])
+    return positions
+
+
+@pytest.mark.parametrize('color', [RED, BLUE])
+@pytest.mark.parametrize('mid_eval', MID_EVALS)
+def test_batch_eval_matches_mid_eval(mid_eval, color):
+    pytest.importorskip('numpy')
+    bot = gamebot.Bot(GameState(Board(), color), color, mid_eval=mid_eval, batch_eval=True)
+    positions = random_positions(0)
+    expected = []
+    for masks in positions:
+        board = Board()
+        board.set_position(*masks)
+        expected.append(bot._mid_eval(board))
+    assert bot._batch_eval(positions) == pytest.approx(expected)
+    assert bot._batch_eval([]) == []
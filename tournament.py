@@ -0,0 +1,196 @@
+"""
+tournament.py
+
+Plays many headless games between two bot configurations on a pool of worker processes
+and writes a summary of the results.
+
+    python3 tournament.py --games 200 \
+        --bot-a method=alpha_beta,mid_eval=piece_and_board,end_eval=sum_of_dist,depth=3 \
+        --bot-b method=alpha_beta,mid_eval=piece_and_board_pov,end_eval=sum_of_dist,depth=3
+
+Bot A plays BLUE (who moves first) in the even numbered games and RED in the odd ones.
+A game that reaches --max-plies without a winner is a draw. With --records the moves of every game
+are written as game records that book.py can build an opening book from (or as PDN or binary records
+if the file name ends in .pdn or .bin, see notation.py), and with --stats the search stats
+(gamebot.SearchStats) of every move are written as JSON lines.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+
+import checkers
+import gamebot
+import notation
+
+# Bot arguments that are not strings
+INT_ARGS = ('depth', 'tt_size_mb', 'time_limit_ms', 'book_depth', 'max_quiescence', 'workers')
+BOOL_ARGS = ('move_ordering', 'batch_eval', 'quiescence', 'ponder')
+FLOAT_ARGS = ('aspiration_window',)
+
+
+def parse_bot(text):
+    """Turns 'method=alpha_beta,depth=3,...' into keyword arguments for gamebot.Bot."""
+    config = {}
+    for item in text.split(','):
+        key, value = item.split('=', 1)
+        key = key.strip()
+        value = value.strip()
+        if key in INT_ARGS:
+            value = int(value)
+        elif key in BOOL_ARGS:
+            if value.lower() not in ('1', 'true', 'yes', 'on', '0', 'false', 'no', 'off'):
+                raise ValueError('%s must be true or false, not %r' % (key, value))
+            value = value.lower() in ('1', 'true', 'yes', 'on')
+        elif key in FLOAT_ARGS:
+            value = float(value)
+        config[key] = value
+    return config
+
+
+def play_game(job):
+    """
+    Plays one game in a worker process. Returns a dict with the winner ('a', 'b' or None for a draw),
+    for each bot the number of moves it made, the nodes it searched and the seconds it spent, and the
+    moves played as [start, path] lists, and the search stats of every move if asked for.
+    """
+    index, config_a, config_b, max_plies, forced_capture, seed, collect_stats = job
+    random.seed(seed)
+    a_color = checkers.BLUE if index % 2 == 0 else checkers.RED
+    b_color = checkers.RED if a_color == checkers.BLUE else checkers.BLUE
+    stats = {'a': [0, 0, 0.0], 'b': [0, 0, 0.0]}  # moves, nodes, seconds
+
+    with contextlib.redirect_stdout(io.StringIO()):  # Game and Bot print as they play
+        game = checkers.Game(loop_mode=True, forced_capture=forced_capture, headless=True)
+        bots = {a_color: ('a', gamebot.Bot(game, a_color, **config_a)),
+                b_color: ('b', gamebot.Bot(game, b_color, **config_b))}
+        winner = None
+        moves = []
+        search_stats = []
+        for ply in range(max_plies):
+            name, bot = bots[game.turn]
+            start = perf_counter()
+            if collect_stats:
+                step_stats = bot.step(game.board, return_stats=True)
+                nodes = step_stats.nodes
+                search_stats.append(dict(step_stats.as_dict(), game=index, bot=name, ply=ply))
+            else:
+                nodes = bot.step(game.board, True)
+            stats[name][0] += 1
+            stats[name][1] += (nodes or 0) + bot._count_quiescence_nodes
+            stats[name][2] += perf_counter() - start
+            moves.append([bot.last_move.start, list(bot.last_move.path)])
+            if game.endit:
+                # the side left to move has no moves and lost
+                winner = 'a' if game.turn == b_color else 'b'
+                break
+        for name, bot in bots.values():
+            bot.close()
+
+    return {'game': index, 'a_color': 'BLUE' if a_color == checkers.BLUE else 'RED', 'winner': winner,
+            'plies': len(moves), 'stats': stats, 'moves': moves, 'search_stats': search_stats}
+
+
+def write_records(results, path, forced_capture):
+    # JSON lines game records, or PDN or binary ones by the extension of path
+    records = []
+    for result in results:
+        winner = None
+        if result['winner'] is not None:
+            a_won = result['winner'] == 'a'
+            winner = 'blue' if (result['a_color'] == 'BLUE') == a_won else 'red'
+        records.append({'moves': result['moves'], 'winner': winner})
+    if path.endswith('.bin'):
+        with notation.RecordWriter(path) as writer:
+            for record in records:
+                writer.write(notation.json_record(record, forced_capture))
+    elif path.endswith('.pdn'):
+        with open(path, 'w') as file:
+            for index, record in enumerate(records):
+                file.write(('\n' if index else '') +
+                           notation.write_pdn(notation.json_record(record, forced_capture), {'Round': index + 1}))
+    else:
+        with open(path, 'w') as file:
+            for record in records:
+                file.write(json.dumps(record) + '\n')
+
+
+def summarize(results, config_a, config_b):
+    summary = {'games': len(results), 'bots': {}}
+    for name, config in (('a', config_a), ('b', config_b)):
+        other = 'b' if name == 'a' else 'a'
+        moves = sum(result['stats'][name][0] for result in results)
+        nodes = sum(result['stats'][name][1] for result in results)
+        seconds = sum(result['stats'][name][2] for result in results)
+        summary['bots'][name] = {
+            'config': config,
+            'wins': sum(result['winner'] == name for result in results),
+            'losses': sum(result['winner'] == other for result in results),
+            'draws': sum(result['winner'] is None for result in results),
+            'nodes_per_move': nodes / moves if moves else 0,
+            'ms_per_move': 1000 * seconds / moves if moves else 0,
+        }
+    summary['average_plies'] = sum(result['plies'] for result in results) / len(results) if results else 0
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bot-a', type=parse_bot, required=True, help='Bot arguments as key=value,key=value')
+    parser.add_argument('--bot-b', type=parse_bot, required=True, help='Bot arguments as key=value,key=value')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes (default: one per core)')
+    parser.add_argument('--max-plies', type=int, default=200, help='plies before a game is called a draw')
+    parser.add_argument('--forced-capture', action='store_true', help='a player must jump when they can')
+    parser.add_argument('--seed', type=int, default=0, help='game i uses random seed seed + i')
+    parser.add_argument('--output', default='tournament.json', help='where to write the summary')
+    parser.add_argument('--records', help='also write the games as game records: JSON lines (see book.py), '
+                                          'or PDN or binary if the name ends in .pdn or .bin (see notation.py)')
+    parser.add_argument('--stats', help='also write the search stats of every move as JSON lines')
+    args = parser.parse_args()
+    if args.max_plies < 1:
+        parser.error('--max-plies must be at least 1')
+
+    jobs = [(index, args.bot_a, args.bot_b, args.max_plies, args.forced_capture, args.seed + index, bool(args.stats))
+            for index in range(args.games)]
+    results = []
+    start = perf_counter()
+    # the workers of a ProcessPoolExecutor are not daemons, so a bot with workers=N can start its own pool
+    with ProcessPoolExecutor(args.workers) as pool:
+        for future in as_completed([pool.submit(play_game, job) for job in jobs]):
+            result = future.result()
+            results.append(result)
+            print('game %d/%d: %s' % (len(results), args.games,
+                                       'draw' if result['winner'] is None else 'bot ' + result['winner'] + ' wins'))
+
+    results.sort(key=lambda result: result['game'])
+    if args.records:
+        write_records(results, args.records, args.forced_capture)
+    if args.stats:
+        with open(args.stats, 'w') as file:
+            for result in results:
+                for step_stats in result['search_stats']:
+                    file.write(json.dumps(step_stats) + '\n')
+    for result in results:
+        del result['moves']
+        del result['search_stats']
+    summary = summarize(results, args.bot_a, args.bot_b)
+    summary['seconds'] = perf_counter() - start
+    summary['results'] = results
+    with open(args.output, 'w') as file:
+        json.dump(summary, file, indent=2)
+
+    for name in ('a', 'b'):
+        bot = summary['bots'][name]
+        print('bot %s: %d wins, %d losses, %d draws, %.0f nodes/move, %.1f ms/move' % (
+            name, bot['wins'], bot['losses'], bot['draws'], bot['nodes_per_move'], bot['ms_per_move']))
+    print('%d games in %.1f s, summary written to %s' % (summary['games'], summary['seconds'], args.output))
+
+
+if __name__ == "__main__":
+    main()